@@ -1,6 +1,18 @@
 """
 Specify what is available to import from the behresp package.
 """
-from behresp.behavior import response, quantity_response, labor_response
+from behresp.behavior import (response, response_grid, response_many,
+                              response_years, response_chunks,
+                              response_aggregates, response_estimate,
+                              quantity_response, labor_response)
+from behresp.cache import BaselineCache
+from behresp.dump import response_dump, DumpHandle
+from behresp.profiling import ResponseProfile
+from behresp.shared import (SharedCalculator, shared_response,
+                            SharedResponsePool)
+from behresp.server import ResponseServer
+from behresp.aio import response_async, response_many_async
+from behresp.uncertainty import response_uncertainty, bootstrap_weights
+from behresp.preview import response_preview, ResponsePreview
 
 __version__ = '0.0.0'
@@ -0,0 +1,208 @@
+"""
+Asyncio interface to the Behavioral-Responses logic.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle aio.py
+# pylint --disable=locally-disabled aio.py
+
+import asyncio
+import functools
+import numpy as np
+import taxcalc as tc
+from behresp.behavior import (_elasticity_values, _mtrs_needed, _copy_calc,
+                              _calc_all_and_mtrs, _reform_response,
+                              _dataframe, _dump_variables)
+from behresp.shared import SharedCalculator
+
+
+PHASES = ('baseline', 'reform', 'response')
+
+
+async def response_async(calc_1, calc_2, elasticities, dump=False,
+                         lowcopy=False, incremental=False, executor=None,
+                         timeouts=None):
+    """
+    Coroutine that implements the response function logic without blocking
+    the event loop, returning the same (df1, df2) tuple as the response
+    function when it is called with the same calc_1, calc_2, elasticities,
+    dump, lowcopy and incremental arguments.
+
+    The work is done in three phases, each of which is run in the executor:
+     'baseline': the calc_1 calc_all() call, its marginal tax rate
+       calculations and the df1 DataFrame extraction,
+     'reform': the calc_2 calc_all() call and its marginal tax rate
+       calculations, which is run concurrently with the baseline phase, and
+     'response': adding the behavioral responses, the post-response
+       calc_all() call and the df2 DataFrame extraction.
+
+    The optional executor argument can be any concurrent.futures.Executor
+    object.  When executor=None (its default value), the default executor
+    of the event loop (a thread pool) is used.  Tax-Calculator holds the
+    global interpreter lock during most of its calculations, so a process
+    pool runs the phases of several calls in parallel, but then calc_1 and
+    calc_2 must be SharedCalculator objects (because Calculator objects
+    cannot be pickled).  SharedCalculator objects can also be used with a
+    thread pool.
+
+    The optional timeouts argument can be a dictionary containing the
+    maximum number of seconds allowed for any of the phases, whose names
+    are the dictionary keys.  When a phase does not finish in time,
+    asyncio.TimeoutError is raised.
+
+    When the coroutine is cancelled or a phase times out, phases that have
+    not started running in the executor are cancelled and no later phase is
+    started.  A phase that is already running in a worker thread or process
+    cannot be interrupted and runs to completion, so an abandoned call stops
+    consuming a worker after at most one phase.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    _check_arguments(calc_1, [calc_2], timeouts)
+    be_values = _be_values(elasticities, calc_1)
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    dvars = _dump_variables() if dump else None
+    phase = functools.partial(_run_phase, asyncio.get_running_loop(),
+                              executor, timeouts or dict())
+    (res1, df1), (arrays2, res2) = await _gather(
+        phase('baseline', _baseline_phase,
+              calc_1, wage_mtr, ltcg_mtr, dvars, lowcopy),
+        phase('reform', _reform_phase, calc_2, wage_mtr, ltcg_mtr, lowcopy))
+    df2 = await phase('response', _response_phase, calc_2, arrays2,
+                      res1, res2, be_values, dvars, incremental)
+    return (df1, df2)
+
+
+async def response_many_async(calc_1, calc_2_list, elasticities, dump=False,
+                              lowcopy=False, incremental=False,
+                              executor=None, timeouts=None):
+    """
+    Coroutine that implements the response_many function logic without
+    blocking the event loop, returning the same (df1, df2s) tuple as the
+    response_many function (with stream=False) when it is called with the
+    same calc_1, calc_2_list, elasticities, dump, lowcopy and incremental
+    arguments.
+
+    The baseline phase is run once and the reform and response phases are
+    run for each Calculator object in calc_2_list, all of them concurrently
+    in the executor (subject to the executor's number of workers).  The
+    executor and timeouts arguments, and the cancellation of phases, are
+    the same as in the response_async function, except that any phase
+    failure or timeout cancels all the phases of the batch.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    _check_arguments(calc_1, calc_2_list, timeouts)
+    be_values = _be_values(elasticities, calc_1)
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    dvars = _dump_variables() if dump else None
+    phase = functools.partial(_run_phase, asyncio.get_running_loop(),
+                              executor, timeouts or dict())
+    baseline = asyncio.ensure_future(phase(
+        'baseline', _baseline_phase,
+        calc_1, wage_mtr, ltcg_mtr, dvars, lowcopy))
+
+    async def reform_response(calc_2):
+        arrays2, res2 = await phase('reform', _reform_phase,
+                                    calc_2, wage_mtr, ltcg_mtr, lowcopy)
+        res1, _ = await asyncio.shield(baseline)
+        return await phase('response', _response_phase, calc_2, arrays2,
+                           res1, res2, be_values, dvars, incremental)
+
+    results = await _gather(baseline, *[reform_response(calc_2)
+                                        for calc_2 in calc_2_list])
+    return (results[0][1], results[1:])
+
+
+def _check_arguments(calc_1, calc_2_list, timeouts):
+    """
+    Check the Calculator and timeouts arguments of the coroutines.
+    """
+    for calc in [calc_1] + list(calc_2_list):
+        assert isinstance(calc, (tc.Calculator, SharedCalculator))
+    assert timeouts is None or isinstance(timeouts, dict)
+    if timeouts is not None:
+        for name, seconds in timeouts.items():
+            assert name in PHASES, 'unknown phase {}'.format(name)
+            assert seconds is None or seconds > 0
+
+
+async def _gather(*awaitables):
+    """
+    Return list of results of the awaitables, which run concurrently, after
+    cancelling all the others when any one of them raises an exception.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _run_phase(loop, executor, timeouts, name, function, *args):
+    """
+    Return result of calling function with args in the executor, raising
+    asyncio.TimeoutError when the call takes longer than the number of
+    seconds for the named phase in timeouts.
+    """
+    # pylint: disable=too-many-arguments
+    future = loop.run_in_executor(executor, functools.partial(function,
+                                                              *args))
+    return await asyncio.wait_for(future, timeouts.get(name))
+
+
+def _be_values(elasticities, calc_1):
+    """
+    Return the _elasticity_values tuple of elasticities, for which a
+    SharedCalculator object calc_1 is reconstructed in the current process
+    only when per-record or group elasticities are specified.
+    """
+    be_values = _elasticity_values(elasticities)
+    if any(np.ndim(value) > 0 for value in be_values):
+        be_values = _elasticity_values(elasticities, _calculator(calc_1))
+    return be_values
+
+
+def _calculator(calc):
+    """
+    Return Calculator object calc or the Calculator object reconstructed
+    from SharedCalculator object calc.
+    """
+    if isinstance(calc, SharedCalculator):
+        return calc.calculator()
+    return calc
+
+
+def _baseline_phase(calc_1, wage_mtr, ltcg_mtr, dvars, lowcopy):
+    """
+    Return (res1, df1) tuple containing the pre-response baseline results
+    and DataFrame of calc_1.
+    """
+    calc1 = _copy_calc(_calculator(calc_1), lowcopy)
+    res1 = _calc_all_and_mtrs(calc1, wage_mtr, ltcg_mtr)
+    return (res1, _dataframe(calc1, dvars, res1['wage_mtr']))
+
+
+def _reform_phase(calc_2, wage_mtr, ltcg_mtr, lowcopy):
+    """
+    Return (arrays, res2) tuple containing the calculated variables and the
+    pre-response reform results of calc_2.
+    """
+    calc2 = _copy_calc(_calculator(calc_2), lowcopy)
+    res2 = _calc_all_and_mtrs(calc2, wage_mtr, ltcg_mtr, side='reform')
+    # pylint: disable=protected-access
+    arrays = {var: calc2.array(var)
+              for var in calc2._Calculator__records.CALCULATED_VARS}
+    return (arrays, res2)
+
+
+def _response_phase(calc_2, arrays, res1, res2, be_values, dvars,
+                    incremental):
+    """
+    Return reform DataFrame incorporating the behavioral responses, given
+    the calculated variables of calc_2 returned by the reform phase.
+    """
+    # pylint: disable=too-many-arguments
+    calc2 = _copy_calc(_calculator(calc_2), lowcopy=True)
+    for var, value in arrays.items():
+        calc2.array(var, value)
+    return _reform_response(calc2, res1, res2, be_values, dvars, incremental)
@@ -4,13 +4,26 @@ Partial-equilibrium elasticity-based Behavioral-Responses logic.
 # CODING-STYLE CHECKS:
 # pycodestyle behavior.py
 # pylint --disable=locally-disabled behavior.py
+# pylint: disable=too-many-lines
 
+import collections
+import contextlib
 import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import pandas as pd
 import taxcalc as tc
+from behresp.cache import BaselineCache
+from behresp.profiling import ResponseProfile
+from behresp.kernels import (pch_kernel, quantity_kernel, labor_kernel,
+                             floor_pch_kernel, mtr_pch_kernel,
+                             scenario_kernel, apply_kernel)
 
 
-def response(calc_1, calc_2, elasticities, dump=False):
+def response(calc_1, calc_2, elasticities, dump=False, lowcopy=False,
+             incremental=False, n_jobs=1, cache=None, profile=None,
+             dedup=False):
     """
     Implements TaxBrain "Partial Equilibrium Simulation" dynamic analysis
     returning results as a tuple of Pandas DataFrame objects (df1, df2) where:
@@ -49,6 +62,20 @@ def response(calc_1, calc_2, elasticities, dump=False):
        Read response function documentation (see below) for discussion of
        appropriate values.
 
+    Each elasticity can be a number, which applies to all filing units, or
+    an array containing one value for each filing unit in calc_1 and calc_2,
+    which allows heterogeneous elasticities to be modeled in a single pass
+    over the whole sample (the sign restrictions apply to every value).
+    Alternatively, when the dictionary also contains a 'group' key, whose
+    value is the name of a records variable (such as 'MARS') or an array of
+    group values for the filing units, each elasticity can be a dictionary
+    that maps group values to elasticities, with filing units in groups
+    that are not in the dictionary assumed to have a zero elasticity.
+    For example, {'group': 'MARS', 'sub': {1: 0.2, 2: 0.3}, 'inc': -0.1}
+    specifies substitution elasticities for single and married-joint filing
+    units and one income elasticity for all filing units.  The group values
+    are those of calc_1.
+
     The optional dump argument controls the number of variables included
     in the two returned DataFrame objects.  When dump=False (its default
     value), the variables in the two returned DataFrame objects include
@@ -62,6 +89,64 @@ def response(calc_1, calc_2, elasticities, dump=False):
     in the dump output of this response function by mtr_combined, which
     is the sum of mtr_inctax and mtr_paytax.
 
+    The optional lowcopy argument controls how calc_1 and calc_2 are copied.
+    When lowcopy=False (its default value), each is deep copied.  When
+    lowcopy=True, each copy shares with the original Calculator object all
+    the records arrays that are never changed by the response function and
+    has its own copy of all the other records arrays, which reduces the
+    memory and time used for copying while leaving calc_1 and calc_2
+    unchanged.
+
+    The optional incremental argument controls how post-reform taxes are
+    recalculated after adding the behavioral responses.  When
+    incremental=False (its default value), taxes are recalculated for all
+    filing units.  When incremental=True, taxes are recalculated only for
+    the filing units whose income changes because of the behavioral
+    responses and the results are spliced into the pre-response reform
+    results for the other filing units, which produces the same results
+    in much less time when most filing units have no behavioral response.
+
+    The optional n_jobs argument controls whether the pre-response baseline
+    and reform calculations (their calc_all() calls and marginal tax rate
+    calculations) are done concurrently.  When n_jobs=1 (its default value),
+    they are done one after the other in the current process.  When n_jobs
+    is greater than one, they are done in two worker processes, which
+    produces exactly the same results.  Worker processes are created by
+    forking the current process (because Policy objects cannot be pickled),
+    so n_jobs > 1 is not supported on Windows.
+
+    The optional cache argument can be a BaselineCache object, in which case
+    the pre-response baseline results (the DataFrame variables and the
+    marginal tax rates) are loaded from the cache when they have already
+    been computed for the same calc_1 records, policy and year, and are
+    stored in the cache otherwise.  When cache=None (its default value),
+    the baseline results are always computed.
+
+    The optional profile argument can be a ResponseProfile object, in which
+    case the wall time, CPU time and peak allocated memory of each phase of
+    the response calculation (copying calc_1 and calc_2, the baseline and
+    reform calc_all() calls and marginal tax rate calculations, loading and
+    storing cached baseline results, adding the behavioral responses, the
+    post-response reform calc_all() call, and extracting the DataFrame
+    objects) are recorded in that object.  When n_jobs is greater than one,
+    the concurrent baseline and reform calculations are recorded as a single
+    phase.  When profile=None (its default value), nothing is recorded.
+
+    The optional dedup argument controls whether filing units with identical
+    tax-relevant input variables (all the input variables except s006 and
+    the DEDUP_IGNORED_VARS, which are not used in the tax calculations) in
+    both calc_1 and calc_2 are collapsed before the response calculations.
+    When dedup=False (its default value), every filing unit is calculated.
+    When dedup=True, the identical filing units are found by hashing their
+    input variables, the response logic is applied to just one copy of
+    each group of identical filing units (whose s006 weight is the sum of
+    the group's weights), and the results are expanded back to all the
+    filing units in their original order (with their own s006 and
+    DEDUP_IGNORED_VARS values), which produces the same results in much
+    less time when there are many identical filing units.  When profile is
+    not None, collapsing and expanding are recorded as the dedup and expand
+    phases.
+
     Note: the use here of a dollar-change income elasticity (rather than
       a proportional-change elasticity) is consistent with Feldstein and
       Feenberg, "The Taxation of Two Earner Families", NBER Working Paper
@@ -90,161 +175,1304 @@ def response(calc_1, calc_2, elasticities, dump=False):
       rate elasticity of -0.792.
 
     """
-    # pylint: disable=too-many-locals,too-many-statements,too-many-branches
+    # pylint: disable=too-many-locals,too-many-arguments
+    # Check function argument types
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    assert profile is None or isinstance(profile, ResponseProfile)
+    be_values = _elasticity_values(elasticities, calc_1)
+    if dedup:
+        with _phase(profile, 'dedup'):
+            calc1, calc2, index, inverse = _dedup_calcs(
+                calc_1, calc_2, [value for value in be_values
+                                 if np.ndim(value) > 0])
+        if inverse is not None:
+            df1, df2 = response(calc1, calc2,
+                                _subset_elasticities(be_values, index),
+                                dump=dump,
+                                lowcopy=True, incremental=incremental,
+                                n_jobs=n_jobs, cache=cache, profile=profile)
+            del calc1
+            del calc2
+            with _phase(profile, 'expand'):
+                df1 = _expand_dataframe(df1, inverse, calc_1)
+                df2 = _expand_dataframe(df2, inverse, calc_2)
+            return (df1, df2)
+    dvars = _dump_variables() if dump else None
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    # Compute pre-response baseline and reform results
+    with _phase(profile, 'cache_load'):
+        cache_key = None if cache is None else cache.key(calc_1)
+        res1, df1 = _cached_baseline(cache, cache_key, calc_1,
+                                     wage_mtr, ltcg_mtr, dvars)
+    if res1 is None:
+        with _phase(profile, 'copy'):
+            calc1 = _copy_calc(calc_1, lowcopy)
+            calc2 = _copy_calc(calc_2, lowcopy)
+        res1, res2 = _calc_all_and_mtrs12(calc1, calc2, wage_mtr=wage_mtr,
+                                          ltcg_mtr=ltcg_mtr, n_jobs=n_jobs,
+                                          profile=profile)
+        # Extract dataframe from calc1
+        with _phase(profile, 'baseline_dataframe'):
+            df1 = _dataframe(calc1, dvars, res1['wage_mtr'])
+        if cache is not None:
+            with _phase(profile, 'cache_store'):
+                _store_baseline(cache, cache_key, calc1, res1, dvars,
+                                wage_mtr, ltcg_mtr)
+        del calc1
+    else:
+        with _phase(profile, 'copy'):
+            calc2 = _copy_calc(calc_2, lowcopy)
+        res2 = _calc_all_and_mtrs(calc2, wage_mtr, ltcg_mtr,
+                                  profile=profile, side='reform')
+        assert calc2.array_len == res1['c04800'].size
+        assert calc2.current_year == calc_1.current_year
+    # Add behavioral-response changes to income sources and
+    # recalculate post-reform taxes incorporating behavioral responses
+    # (calc2 is a private copy of calc_2, so it can be changed in place)
+    df2 = _reform_response(calc2, res1, res2, be_values, dvars,
+                           incremental, profile=profile)
+    del calc2
+    # Return the two dataframes
+    return (df1, df2)
+
+
+def response_grid(calc_1, calc_2, elasticities_list, dump=False,
+                  lowcopy=False, incremental=False, n_jobs=1):
+    """
+    Implements the response function logic for each of several alternative
+    elasticities dictionaries in the elasticities_list, returning results
+    as a tuple (df1, df2_list) where:
+    df1 is the baseline-policy DataFrame, which does not depend on the
+        elasticities, and
+    df2_list is a list of reform-policy DataFrame objects containing one
+        DataFrame for each elasticities dictionary in elasticities_list.
+    The DataFrame objects have the same content as those returned by the
+    response function when it is called with the same calc_1, calc_2, dump,
+    lowcopy and incremental arguments and each of the dictionaries in
+    elasticities_list, except that when dump=True the mtr_combined variable
+    in df1 contains the marginal tax rate on taxpayer earnings whenever any
+    dictionary in elasticities_list has a nonzero sub or inc elasticity.
+
+    All the work that does not depend on the elasticities (copying the
+    calc_1 and calc_2 objects, their calc_all() calls, and the marginal tax
+    rate calculations) is done only once, so only the behavioral-response
+    changes in calc_2 records and the final reform-policy calc_all() call
+    are repeated for each elasticities dictionary.
+
+    The optional n_jobs argument specifies the maximum number of worker
+    processes used to do the per-dictionary work (and, as in the response
+    function, whether the pre-response baseline and reform calculations
+    are done concurrently).  When n_jobs=1 (its default value), all the work
+    is done in the current process.  As in the response function, worker
+    processes are forked, so n_jobs > 1 is not supported on Windows.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    assert isinstance(elasticities_list, list)
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    be_list = [_elasticity_values(elasticities, calc_1)
+               for elasticities in elasticities_list]
+    calc1 = _copy_calc(calc_1, lowcopy)
+    calc2 = _copy_calc(calc_2, lowcopy)
+    # Compute pre-response baseline and reform results just once
+    needed = [_mtrs_needed(be_values) for be_values in be_list]
+    wage_mtr = any(wage for wage, _ in needed)
+    ltcg_mtr = any(ltcg for _, ltcg in needed)
+    res1, res2 = _calc_all_and_mtrs12(calc1, calc2, wage_mtr=wage_mtr,
+                                      ltcg_mtr=ltcg_mtr, n_jobs=n_jobs)
+    dvars = _dump_variables() if dump else None
+    df1 = _dataframe(calc1, dvars, res1['wage_mtr'])
+    del calc1
+    # Compute behavioral response for each elasticities dictionary
+    if n_jobs == 1:
+        df2_list = [_reform_response(_copy_calc(calc2, lowcopy),
+                                     _scenario_mtrs(res1, be_values),
+                                     _scenario_mtrs(res2, be_values),
+                                     be_values, dvars, incremental)
+                    for be_values in be_list]
+    else:
+        state = {'calc2': calc2, 'res1': res1, 'res2': res2, 'dvars': dvars,
+                 'lowcopy': lowcopy, 'incremental': incremental}
+        with _process_pool(n_jobs, state) as pool:
+            df2_list = list(pool.map(_grid_worker, be_list))
+    del calc2
+    return (df1, df2_list)
+
+
+def response_many(calc_1, calc_2_list, elasticities, dump=False,
+                  lowcopy=False, incremental=False, stream=False, n_jobs=1,
+                  cache=None):
+    """
+    Implements the response function logic for each of several reform-policy
+    Calculator objects in calc_2_list, all of which are compared with the
+    same baseline-policy calc_1, returning results as a tuple (df1, df2s)
+    where:
+    df1 is the baseline-policy DataFrame, which is extracted just once, and
+    df2s is a list of reform-policy DataFrame objects containing one
+        DataFrame for each Calculator object in calc_2_list or, when
+        stream=True, a generator that yields those DataFrame objects one
+        at a time so that they do not all have to be held in memory.
+    The DataFrame objects have the same content as those returned by the
+    response function when it is called with the same calc_1, elasticities,
+    dump, lowcopy and incremental arguments and each of the Calculator
+    objects in calc_2_list.
+
+    The baseline-policy work (copying calc_1, its calc_all() call and its
+    marginal tax rate calculations) is done only once, or not at all when
+    the optional cache argument is a BaselineCache object that contains the
+    baseline results (see the response function documentation).  When
+    stream=True, calc_2_list can be any iterable (such as a generator) when
+    n_jobs=1.
+
+    The optional n_jobs argument specifies the maximum number of worker
+    processes used to do the per-reform work.  When n_jobs=1 (its default
+    value), all the work is done in the current process.  When stream=True,
+    no more than n_jobs reform results are held in memory at any time.
+    As in the response function, worker processes are forked, so n_jobs > 1
+    is not supported on Windows.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    assert isinstance(calc_1, tc.Calculator)
+    be_values = _elasticity_values(elasticities, calc_1)
+    # Compute pre-response baseline results just once
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    state = {'wage_mtr': wage_mtr,
+             'ltcg_mtr': ltcg_mtr,
+             'be_values': be_values,
+             'dvars': _dump_variables() if dump else None,
+             'lowcopy': lowcopy,
+             'incremental': incremental,
+             'array_len': calc_1.array_len,
+             'current_year': calc_1.current_year}
+    cache_key = None if cache is None else cache.key(calc_1)
+    state['res1'], df1 = _cached_baseline(cache, cache_key, calc_1,
+                                          state['wage_mtr'],
+                                          state['ltcg_mtr'], state['dvars'])
+    if state['res1'] is None:
+        calc1 = _copy_calc(calc_1, lowcopy)
+        state['res1'] = _calc_all_and_mtrs(calc1, state['wage_mtr'],
+                                           state['ltcg_mtr'])
+        df1 = _dataframe(calc1, state['dvars'], state['res1']['wage_mtr'])
+        if cache is not None:
+            _store_baseline(cache, cache_key, calc1, state['res1'],
+                            state['dvars'], state['wage_mtr'],
+                            state['ltcg_mtr'])
+        del calc1
+    # Compute behavioral response for each reform-policy Calculator object
+    if n_jobs == 1:
+        df2s = (_many_reform_response(calc_2, state)
+                for calc_2 in calc_2_list)
+    else:
+        assert isinstance(calc_2_list, list)
+        state['calc_2_list'] = calc_2_list
+        df2s = _pool_results(_process_pool(n_jobs, state), _many_worker,
+                             range(len(calc_2_list)), window=n_jobs)
+    if not stream:
+        df2s = list(df2s)
+    return (df1, df2s)
+
+
+def response_years(calc_1, calc_2, elasticities, years, dump=False,
+                   incremental=False, n_jobs=1):
+    """
+    Implements the response function logic for each year in the years list,
+    returning results as a dictionary whose keys are the years (in
+    increasing order) and whose values are the (df1, df2) tuples returned
+    by the response function when it is called with copies of calc_1 and
+    calc_2 that have been advanced to that year.  All years must be no
+    earlier than the current year of calc_1 and calc_2, which are not
+    affected by this function.
+
+    The optional n_jobs argument specifies the maximum number of worker
+    processes used to do the work, one task per year.  When n_jobs=1 (its
+    default value), all the work is done in the current process.  Worker
+    processes are created by forking the current process, so calc_1 and
+    calc_2 (and their records) are not pickled for each year but inherited
+    just once by each worker process, and n_jobs > 1 is not supported on
+    Windows.
+    """
+    # pylint: disable=too-many-arguments
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    _elasticity_values(elasticities, calc_1)
+    years = sorted(set(years))
+    for year in years:
+        assert year >= max(calc_1.current_year, calc_2.current_year)
+    state = {'calc_1': calc_1, 'calc_2': calc_2,
+             'elasticities': elasticities, 'dump': dump,
+             'incremental': incremental}
+    if n_jobs == 1:
+        # advance a single pair of calculator copies from year to year
+        calc1 = copy.deepcopy(calc_1)
+        calc2 = copy.deepcopy(calc_2)
+        results = dict()
+        for year in years:
+            calc1.advance_to_year(year)
+            calc2.advance_to_year(year)
+            results[year] = response(calc1, calc2, elasticities, dump=dump,
+                                     lowcopy=True, incremental=incremental)
+        return results
+    with _process_pool(n_jobs, state) as pool:
+        return dict(zip(years, pool.map(_years_worker, years)))
+
+
+def response_chunks(calc_1, calc_2, elasticities, chunk_size, dump=False,
+                    incremental=False, stream=False, n_jobs=1):
+    """
+    Implements the response function logic for consecutive chunks of at
+    most chunk_size filing units, which bounds the memory used by the
+    calculations by chunk size rather than sample size.  This produces the
+    same results as the response function because all the behavioral-
+    response calculations are done separately for each filing unit.
+    Neither calc_1 nor calc_2 are affected by this function.
+
+    When stream=False (its default value), the results are returned as a
+    tuple (df1, df2) of DataFrame objects that have the same content as
+    those returned by the response function.  When stream=True, a generator
+    is returned that yields a (df1, df2) tuple for each chunk, where the
+    DataFrame index contains the positions of the chunk's filing units in
+    calc_1 and calc_2, so that the chunk results can be written elsewhere
+    (and released) one at a time.
+
+    The optional n_jobs argument specifies the maximum number of worker
+    processes used to do the per-chunk work.  When n_jobs=1 (its default
+    value), all the work is done in the current process.  No more than
+    n_jobs chunk results are held in memory at any time by the generator.
+    As in the response function, worker processes are forked, so n_jobs > 1
+    is not supported on Windows.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    assert calc_1.array_len == calc_2.array_len
+    be_values = _elasticity_values(elasticities, calc_1)
+    assert isinstance(chunk_size, int) and chunk_size >= 1
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    chunks = [(start, min(start + chunk_size, calc_1.array_len))
+              for start in range(0, calc_1.array_len, chunk_size)]
+    state = {'calc_1': calc_1, 'calc_2': calc_2,
+             'be_values': be_values, 'dump': dump,
+             'incremental': incremental}
+    if n_jobs == 1:
+        results = (_chunk_response(chunk, state) for chunk in chunks)
+    else:
+        results = _pool_results(_process_pool(n_jobs, state), _chunk_worker,
+                                chunks, window=n_jobs)
+    if stream:
+        return results
+    df1_list = list()
+    df2_list = list()
+    for df1, df2 in results:
+        df1_list.append(df1)
+        df2_list.append(df2)
+    df1 = pd.concat(df1_list, ignore_index=True)
+    del df1_list
+    df2 = pd.concat(df2_list, ignore_index=True)
+    del df2_list
+    return (df1, df2)
+
+
+def response_aggregates(calc_1, calc_2, elasticities,
+                        variables=('iitax', 'payrolltax', 'combined',
+                                   'c04800'),
+                        deciles=False, lowcopy=False, incremental=False,
+                        n_jobs=1):
+    """
+    Implements the response function logic returning only weighted totals
+    of the specified variables, which are computed directly from the
+    calculated arrays without constructing any Pandas objects.  The results
+    are returned as a dictionary with 'baseline' and 'reform' keys, each
+    of whose values is a dictionary containing the s006-weighted total of
+    each variable as a float.  When deciles=True, the returned dictionary
+    also contains 'baseline_deciles' and 'reform_deciles' keys, each of
+    whose values is a dictionary containing for each variable a numpy array
+    of the weighted totals in each of the ten deciles of filing units
+    ranked by their baseline expanded_income (with each decile containing
+    one-tenth of the total weight).
+
+    The lowcopy, incremental and n_jobs arguments have the same meaning as
+    in the response function.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    be_values, calc1, calc2, res1, res2 = _pre_response(
+        calc_1, calc_2, elasticities, lowcopy, n_jobs)
+    weight = np.asarray(calc1.array('s006'))
+    decile = None
+    if deciles:
+        decile = _decile_index(calc1.array('expanded_income'), weight)
+    results = dict()
+    _add_aggregates(results, 'baseline', calc1, variables, weight, decile)
+    del calc1
+    calc2 = _add_responses(calc2, res1, res2, be_values, incremental)
+    _add_aggregates(results, 'reform', calc2, variables, weight, decile)
+    del calc2
+    return results
+
+
+def response_estimate(calc_1, calc_2, elasticities, lowcopy=False,
+                      fallback=True):
+    """
+    Implements a fast approximation of the response function logic, which
+    estimates the post-response reform taxes to first order (as the
+    pre-response reform taxes plus the behavioral-response income changes
+    times the reform marginal tax rates) rather than recalculating them,
+    returning results as a tuple (df1, df2) of Pandas DataFrame objects.
+    df1 is the same as the response function df1 (with dump=False), and
+    df2 contains the same variables as the response function df2 (with
+    dump=False), plus two additional variables:
+    unreliable, which is one for filing units whose first-order estimate is
+        unreliable because the behavioral response moves the unit's taxable
+        income (or wages) across a kink in the reform tax schedule (zero
+        taxable income, an ordinary-income or capital-gains tax bracket
+        threshold, or the social security maximum taxable earnings), and is
+        zero otherwise, and
+    estimated, which is one for filing units whose iitax, payrolltax and
+        combined values are first-order estimates, and is zero for filing
+        units whose values are the same as in the response function df2.
+
+    When fallback=True (its default value), the taxes of the unreliable
+    filing units are recalculated exactly, so only the other filing units
+    with income changes are estimated.  When fallback=False, all filing
+    units with income changes are estimated.  Variables other than iitax,
+    payrolltax and combined in the estimated filing units are the
+    pre-response reform values.  Note that the tax schedule contains kinks
+    (for example, credit phase-outs) that are not detected, so the
+    estimates of some reliable filing units may still be inaccurate.
+
+    The time saved is the time of the post-response calc_all() call (and
+    of extracting the DataFrame from its results), because the marginal
+    tax rates are needed by both the exact and the estimated responses.
+
+    The elasticities and lowcopy arguments have the same meaning as in the
+    response function.
+    """
+    # pylint: disable=too-many-locals
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    be_values = _elasticity_values(elasticities, calc_1)
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    calc1 = _copy_calc(calc_1, lowcopy)
+    calc2 = _copy_calc(calc_2, lowcopy)
+    res1 = _calc_all_and_mtrs(calc1, wage_mtr, ltcg_mtr)
+    res2 = _calc_all_and_mtrs(calc2, wage_mtr, ltcg_mtr, side='reform',
+                              wage_parts=True)
+    assert calc1.array_len == calc2.array_len
+    assert calc1.current_year == calc2.current_year
+    df1 = _dataframe(calc1, None, res1['wage_mtr'])
+    del calc1
+    # Compute behavioral-response changes in income sources
+    si_chg, ltcg_chg = _income_changes(res1, res2, *be_values)
+    if si_chg is None:
+        delta_winc = np.zeros(calc2.array_len)
+        delta_oinc = np.zeros(calc2.array_len)
+        delta_ided = np.zeros(calc2.array_len)
+    else:
+        delta_winc, delta_oinc, delta_ided = _ordinary_income_changes(
+            si_chg, calc2)
+    delta_taxinc = delta_winc + delta_oinc - delta_ided
+    # Estimate post-response reform taxes to first order
+    payrolltax_chg = res2['wage_mtr_payroll'] * delta_winc
+    iitax_chg = (res2['wage_mtr_iitax'] * delta_taxinc +
+                 res2['ltcg_mtr'] * ltcg_chg)
+    changed = (delta_taxinc != 0.) | (delta_winc != 0.) | (ltcg_chg != 0.)
+    unreliable = changed & _crosses_kink(calc2, delta_taxinc + ltcg_chg,
+                                         delta_winc)
+    estimated = changed & ~unreliable if fallback else changed
+    # Recalculate exactly the taxes of the changed but not estimated units
+    calc2.incarray('e00200', delta_winc)
+    calc2.incarray('e00200p', delta_winc)
+    calc2.incarray('e00300', delta_oinc)
+    calc2.incarray('e19200', delta_ided)
+    calc2 = _update_cap_gain_income(ltcg_chg, calc2)
+    _calc_all_subset(calc2, np.flatnonzero(changed & ~estimated))
+    df2 = _dataframe(calc2, None, res2['wage_mtr'])
+    del calc2
+    df2.loc[estimated, 'iitax'] += iitax_chg[estimated]
+    df2.loc[estimated, 'payrolltax'] += payrolltax_chg[estimated]
+    df2.loc[estimated, 'combined'] = (df2.loc[estimated, 'iitax'] +
+                                      df2.loc[estimated, 'payrolltax'])
+    df2['unreliable'] = unreliable.astype(np.float64)
+    df2['estimated'] = estimated.astype(np.float64)
+    return (df1, df2)
+
+
+# records variables whose values are changed by the behavioral responses
+RESPONSE_VARS = ('e00200', 'e00200p', 'e00300', 'e19200', 'p23250')
+
+# input variables that are not used in the Tax-Calculator tax calculations
+# (identifiers and variables used only when reading and aging the data),
+# which are ignored when finding identical filing units
+DEDUP_IGNORED_VARS = ('RECID', 'h_seq', 'a_lineno', 'ffpos', 'fips',
+                      'agi_bin', 'FLPDYR', 'data_source')
+
+
+def _copy_calc(calc, lowcopy):
+    """
+    Return a copy of Calculator object calc that can be changed by the
+    response logic without changing calc.  When lowcopy is False, return
+    a deep copy of calc.  When lowcopy is True, the returned copy has its
+    own Records object containing copies of the calculated variables
+    (which calc_all changes in place), the Consumption.RESPONSE_VARS
+    (which calc.mtr changes in place) and the RESPONSE_VARS; all the other
+    records arrays, and the Policy and Consumption objects (which are never
+    changed), are shared with calc.
+    """
+    if not lowcopy:
+        return copy.deepcopy(calc)
+    # pylint: disable=protected-access
+    records = copy.copy(calc._Calculator__records)
+    copy_vars = (records.CALCULATED_VARS |
+                 set(tc.Consumption.RESPONSE_VARS) |
+                 set(RESPONSE_VARS))
+    for var in copy_vars:
+        setattr(records, var, getattr(records, var).copy())
+    calc_copy = copy.copy(calc)
+    calc_copy._Calculator__records = records
+    return calc_copy
 
-    # Check function argument types and elasticity values
-    calc1 = copy.deepcopy(calc_1)
-    calc2 = copy.deepcopy(calc_2)
-    assert isinstance(calc1, tc.Calculator)
-    assert isinstance(calc2, tc.Calculator)
+
+def _elasticity_values(elasticities, calc=None):
+    """
+    Return (be_sub, be_inc, be_cg) tuple of elasticity values extracted
+    from the elasticities dictionary after checking their signs (which is
+    done elementwise for arrays).  Each value is a float or, for per-record
+    or group elasticities, an array containing one value for each filing
+    unit in calc, which is used to check the array lengths and to look up
+    the group of each filing unit (when calc is None, only the signs are
+    checked).
+    """
     assert isinstance(elasticities, dict)
-    be_sub = elasticities['sub'] if 'sub' in elasticities else 0.0
-    be_inc = elasticities['inc'] if 'inc' in elasticities else 0.0
-    be_cg = elasticities['cg'] if 'cg' in elasticities else 0.0
-    assert be_sub >= 0.0
-    assert be_inc <= 0.0
-    assert be_cg <= 0.0
-
-    # Begin nested functions used only in this response function
-    def _update_ordinary_income(taxinc_change, calc):
-        """
-        Implement total taxable income change induced by behavioral response.
-        """
-        # compute AGI minus itemized deductions, agi_m_ided
-        agi = calc.array('c00100')
-        ided = np.where(calc.array('c04470') < calc.array('standard'),
-                        0., calc.array('c04470'))
-        agi_m_ided = agi - ided
-        # assume behv response only for filing units with positive agi_m_ided
-        pos = np.array(agi_m_ided > 0., dtype=bool)
-        delta_income = np.where(pos, taxinc_change, 0.)
-        # allocate delta_income into three parts
-        # pylint: disable=unsupported-assignment-operation
-        winc = calc.array('e00200')
-        delta_winc = np.zeros_like(agi)
-        delta_winc[pos] = delta_income[pos] * winc[pos] / agi_m_ided[pos]
-        oinc = agi - winc
-        delta_oinc = np.zeros_like(agi)
-        delta_oinc[pos] = delta_income[pos] * oinc[pos] / agi_m_ided[pos]
-        delta_ided = np.zeros_like(agi)
-        delta_ided[pos] = delta_income[pos] * ided[pos] / agi_m_ided[pos]
-        # confirm that the three parts are consistent with delta_income
-        assert np.allclose(delta_income, delta_winc + delta_oinc - delta_ided)
-        # add the three parts to different records variables embedded in calc
-        calc.incarray('e00200', delta_winc)
-        calc.incarray('e00200p', delta_winc)
-        calc.incarray('e00300', delta_oinc)
-        calc.incarray('e19200', delta_ided)
-        return calc
-
-    def _update_cap_gain_income(cap_gain_change, calc):
-        """
-        Implement capital gain change induced by behavioral responses.
-        """
-        calc.incarray('p23250', cap_gain_change)
-        return calc
-
-    def _mtr12(calc__1, calc__2, mtr_of='e00200p', tax_type='combined'):
-        """
-        Computes marginal tax rates for Calculator objects calc__1 and calc__2
-        for specified mtr_of income type and specified tax_type.
-        """
-        assert tax_type in ('combined', 'iitax')
-        _, iitax1, combined1 = calc__1.mtr(mtr_of, wrt_full_compensation=True)
-        _, iitax2, combined2 = calc__2.mtr(mtr_of, wrt_full_compensation=True)
-        if tax_type == 'combined':
-            return (combined1, combined2)
-        return (iitax1, iitax2)
-    # End nested functions used only in this response function
-
-    # Begin main logic of response function
-    calc1.calc_all()
-    calc2.calc_all()
+    group = elasticities.get('group', None)
+    values = dict()
+    for name in ('sub', 'inc', 'cg'):
+        value = elasticities[name] if name in elasticities else 0.0
+        if isinstance(value, dict):
+            assert group is not None, \
+                '{} mapping requires a group'.format(name)
+            if calc is not None:
+                value = _group_values(value, group, calc)
+            else:
+                value = np.array(list(value.values()), dtype=np.float64)
+        elif np.ndim(value) > 0:
+            value = np.asarray(value, dtype=np.float64)
+            assert value.ndim == 1
+            if calc is not None:
+                assert value.size == calc.array_len, \
+                    '{} array length differs from number of filing ' \
+                    'units'.format(name)
+        values[name] = value
+    assert np.all(values['sub'] >= 0.0)
+    assert np.all(values['inc'] <= 0.0)
+    assert np.all(values['cg'] <= 0.0)
+    return (values['sub'], values['inc'], values['cg'])
+
+
+def _group_values(mapping, group, calc):
+    """
+    Return array containing for each filing unit in calc the elasticity
+    that the mapping dictionary associates with the filing unit's group,
+    which is zero for groups that are not in mapping, where group is the
+    name of a records variable or an array of group values.  String keys
+    (as in JSON objects) are converted to numbers for numeric groups.
+    """
+    if isinstance(group, str):
+        group = calc.array(group)
+    group = np.asarray(group)
+    assert group.shape == (calc.array_len,), \
+        'group array length differs from number of filing units'
+    values = np.zeros(calc.array_len)
+    for key, value in mapping.items():
+        if isinstance(key, str) and group.dtype.kind in 'biuf':
+            key = float(key)
+        values[group == key] = value
+    return values
+
+
+def _mtrs_needed(be_values):
+    """
+    Return (wage_mtr, ltcg_mtr) tuple specifying whether the marginal tax
+    rates on taxpayer earnings and on long-term capital gains are needed
+    by the be_values tuple of elasticities.
+    """
+    be_sub, be_inc, be_cg = be_values
+    return (bool(np.any(be_sub != 0.0) or np.any(be_inc != 0.0)),
+            bool(np.any(be_cg != 0.0)))
+
+
+def _subset_elasticities(be_values, index):
+    """
+    Return elasticities dictionary containing the be_values tuple of
+    elasticities for the filing units at the positions in the index array.
+    """
+    return {name: value[index] if np.ndim(value) > 0 else value
+            for name, value in zip(('sub', 'inc', 'cg'), be_values)}
+
+
+def _pre_response(calc_1, calc_2, elasticities, lowcopy, n_jobs):
+    """
+    Return (be_values, calc1, calc2, res1, res2) tuple containing the
+    elasticities values, the copies of calc_1 and calc_2, and their
+    pre-response results computed by _calc_all_and_mtrs12 (with only the
+    marginal tax rates needed by the elasticities).
+    """
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    be_values = _elasticity_values(elasticities, calc_1)
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    calc1 = _copy_calc(calc_1, lowcopy)
+    calc2 = _copy_calc(calc_2, lowcopy)
+    res1, res2 = _calc_all_and_mtrs12(calc1, calc2, wage_mtr=wage_mtr,
+                                      ltcg_mtr=ltcg_mtr, n_jobs=n_jobs)
+    return (be_values, calc1, calc2, res1, res2)
+
+
+def _calc_all_and_mtrs(calc, wage_mtr, ltcg_mtr, profile=None,
+                       side='baseline', wage_parts=False):
+    """
+    Call calc.calc_all() and compute the marginal tax rates used in the
+    behavioral-response logic, returning a dictionary of calc arrays.
+    The wage_mtr (ltcg_mtr) argument specifies whether the marginal tax
+    rate on taxpayer earnings (long-term capital gains) is computed;
+    when it is not computed, the dictionary contains an array of zeros.
+    Each of these three calculations is recorded in profile as a phase
+    whose name begins with side.  When wage_parts is True, the dictionary
+    also contains the payroll and income tax parts of the marginal tax rate
+    on taxpayer earnings per dollar of earnings (rather than of full
+    compensation).
+    """
+    # pylint: disable=too-many-arguments
+    with _phase(profile, side + '_calc_all'):
+        calc.calc_all()
+    # calculate marginal tax rates on taxpayer wages+salary and on
+    # long-term capital gains using the calc_all() results
+    # (e00200p is taxpayer's wages+salary and
+    #  p23250 is filing units' long-term capital gains)
+    mtr_vars = [var for var, needed in (('e00200p', wage_mtr),
+                                        ('p23250', ltcg_mtr)) if needed]
+    rates = _mtrs(calc, mtr_vars, profile=profile,
+                  phases={'e00200p': side + '_wage_mtr',
+                          'p23250': side + '_ltcg_mtr'})
+    zeros = np.zeros(calc.array_len)
+    results = dict()
+    if wage_mtr:
+        payroll, iitax, combined = rates['e00200p']
+        results['wage_mtr'] = combined
+        if wage_parts:
+            factor = _compensation_factor(calc)
+            results['wage_mtr_payroll'] = payroll * factor
+            results['wage_mtr_iitax'] = iitax * factor
+    else:
+        results['wage_mtr'] = zeros
+        if wage_parts:
+            results['wage_mtr_payroll'] = zeros.copy()
+            results['wage_mtr_iitax'] = zeros.copy()
+    results['ltcg_mtr'] = rates['p23250'][1] if ltcg_mtr else zeros.copy()
+    # Note: c04800 is filing unit's taxable income and
+    #       combined is f.unit's income+payroll tax liability
+    for var in ('c04800', 'combined', 'p23250'):
+        results[var] = calc.array(var)
+    return results
+
+
+def _calc_all_and_mtrs12(calc1, calc2, wage_mtr, ltcg_mtr, n_jobs,
+                         profile=None):
+    """
+    Return (res1, res2) tuple containing the _calc_all_and_mtrs results for
+    calc1 and calc2, which are computed concurrently in two worker processes
+    when n_jobs is greater than one.  In either case, calc1 and calc2 are
+    left in the state produced by their calc_all() calls.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    if n_jobs == 1:
+        res1 = _calc_all_and_mtrs(calc1, wage_mtr, ltcg_mtr,
+                                  profile=profile, side='baseline')
+        res2 = _calc_all_and_mtrs(calc2, wage_mtr, ltcg_mtr,
+                                  profile=profile, side='reform')
+    else:
+        state = {'calcs': (calc1, calc2),
+                 'wage_mtr': wage_mtr, 'ltcg_mtr': ltcg_mtr}
+        with _phase(profile, 'parallel_calc_all_and_mtrs'):
+            with _process_pool(2, state) as pool:
+                (arrays1, res1), (arrays2, res2) = pool.map(_calc_all_worker,
+                                                            (0, 1))
+        for calc, arrays in ((calc1, arrays1), (calc2, arrays2)):
+            for var, value in arrays.items():
+                calc.array(var, value)
+        del arrays1
+        del arrays2
     assert calc1.array_len == calc2.array_len
     assert calc1.current_year == calc2.current_year
+    return (res1, res2)
+
+
+def _calc_all_worker(calc_index):
+    """
+    Return (arrays, results) tuple containing the calculated variables and
+    the _calc_all_and_mtrs results for the Calculator object at calc_index
+    in the state of the _calc_all_and_mtrs12 function inherited by a worker
+    process.
+    """
+    state = _WORKER_STATE
+    calc = state['calcs'][calc_index]
+    results = _calc_all_and_mtrs(calc, state['wage_mtr'], state['ltcg_mtr'])
+    # pylint: disable=protected-access
+    arrays = {var: calc.array(var)
+              for var in calc._Calculator__records.CALCULATED_VARS}
+    return (arrays, results)
+
+
+def _phase(profile, name):
+    """
+    Return context manager that records the named phase in profile, or
+    that does nothing when profile is None.
+    """
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+
+# aggregate variables that include each marginal-tax-rate variable, which
+# are increased along with it (as in the Calculator.mtr method)
+MTR_AGGREGATES = {'e00200p': ('e00200',), 'e00200s': ('e00200',),
+                  'e00900p': ('e00900',), 'e00650': ('e00600',),
+                  'e26270': ('e02000',), 'k1bx14p': ('e02000', 'e26270')}
+
+
+def _mtrs(calc, variables, profile=None, phases=None):
+    """
+    Return dictionary containing for each variable in the variables list
+    the (payroll, iitax, combined) tuple of marginal tax rate arrays, which
+    are exactly the same as those returned by calc.mtr(variable,
+    wrt_full_compensation=True), given that calc.calc_all() has already
+    been called.  Unlike calc.mtr, which does an unperturbed calc_all()
+    call and deep copies the records for each variable, this function uses
+    the existing calc_all() results as the unperturbed results, so only
+    one perturbed calc_all() call is done for each variable, and during
+    that call the calculated variables (and the consumption response
+    variables) are replaced by copies, which are discarded afterwards, so
+    calc is left in exactly the same state.  The perturbed calculation for
+    each variable is recorded in profile as a phase whose name is the
+    variable's value in the phases dictionary.
+    """
+    # pylint: disable=too-many-locals
+    finite_diff = 0.01  # a one-cent difference, as in calc.mtr
+    # pylint: disable=protected-access
+    records = calc._Calculator__records
+    consumption = calc._Calculator__consumption
+    workspace_vars = set(records.CALCULATED_VARS)
+    if consumption.has_response():
+        workspace_vars |= set(tc.Consumption.RESPONSE_VARS)
+    payrolltax_base = calc.array('payrolltax')
+    incometax_base = calc.array('iitax')
+    combined_taxes_base = incometax_base + payrolltax_base
+    results = dict()
+    for variable_str in variables:
+        assert variable_str in tc.Calculator.MTR_VALID_VARIABLES
+        perturbed_vars = (variable_str,) + MTR_AGGREGATES.get(variable_str,
+                                                              ())
+        name = 'mtr_' + variable_str
+        if phases is not None and variable_str in phases:
+            name = phases[variable_str]
+        with _phase(profile, name):
+            # calculate level of taxes after a marginal increase in income
+            originals = {var: getattr(records, var)
+                         for var in workspace_vars.union(perturbed_vars)}
+            for var in workspace_vars:
+                setattr(records, var, originals[var].copy())
+            for var in perturbed_vars:
+                calc.array(var, originals[var] + finite_diff)
+            if consumption.has_response():
+                consumption.response(records, finite_diff)
+            calc.calc_all()
+            payrolltax_chng = calc.array('payrolltax')
+            incometax_chng = calc.array('iitax')
+            combined_taxes_chng = incometax_chng + payrolltax_chng
+            # restore the unperturbed calc_all() results
+            for var, value in originals.items():
+                setattr(records, var, value)
+            del originals
+            # compute marginal tax rates
+            if variable_str in ('e00200p', 'e00200s'):
+                denominator = finite_diff * _compensation_factor(
+                    calc, variable_str)
+            else:
+                denominator = finite_diff
+            mtr_payrolltax = (payrolltax_chng - payrolltax_base) / denominator
+            mtr_incometax = (incometax_chng - incometax_base) / denominator
+            mtr_combined = ((combined_taxes_chng - combined_taxes_base) /
+                            denominator)
+            if variable_str == 'e00200s':
+                mars = calc.array('MARS')
+                mtr_payrolltax = np.where(mars == 2, mtr_payrolltax, np.nan)
+                mtr_incometax = np.where(mars == 2, mtr_incometax, np.nan)
+                mtr_combined = np.where(mars == 2, mtr_combined, np.nan)
+            results[variable_str] = (mtr_payrolltax, mtr_incometax,
+                                     mtr_combined)
+    return results
+
+
+def _income_changes(res1, res2, be_sub, be_inc, be_cg):
+    """
+    Return (si_chg, ltcg_chg) tuple containing the taxable income change
+    (which is None when be_sub and be_inc are both zero) and the long-term
+    capital gains change induced by behavioral responses, given the res1
+    baseline and res2 reform results of _calc_all_and_mtrs calls.  Each
+    elasticity is a number or an array of per-filing-unit values.
+    """
+    # pylint: disable=too-many-locals
     mtr_cap = 0.99
-    if dump:
-        recs_vinfo = tc.Records(data=None)  # contains records VARINFO only
-        dvars = list(recs_vinfo.USABLE_READ_VARS | recs_vinfo.CALCULATED_VARS)
     # Calculate sum of substitution and income effects
-    if be_sub == 0.0 and be_inc == 0.0:
-        zero_sub_and_inc = True
-        if dump:
-            wage_mtr1 = np.zeros(calc1.array_len)
-            wage_mtr2 = np.zeros(calc2.array_len)
+    if np.all(be_sub == 0.0) and np.all(be_inc == 0.0):
+        si_chg = None
     else:
-        zero_sub_and_inc = False
-        # calculate marginal combined tax rates on taxpayer wages+salary
-        # (e00200p is taxpayer's wages+salary)
-        wage_mtr1, wage_mtr2 = _mtr12(calc1, calc2,
-                                      mtr_of='e00200p',
-                                      tax_type='combined')
         # calculate magnitude of substitution effect
-        if be_sub == 0.0:
-            sub = np.zeros(calc1.array_len)
+        if np.all(be_sub == 0.0):
+            sub = np.zeros(res1['c04800'].shape)
         else:
             # proportional change in marginal net-of-tax rates on earnings
+            wage_mtr1 = res1['wage_mtr']
+            wage_mtr2 = res2['wage_mtr']
             mtr1 = np.where(wage_mtr1 > mtr_cap, mtr_cap, wage_mtr1)
             mtr2 = np.where(wage_mtr2 > mtr_cap, mtr_cap, wage_mtr2)
             pch = ((1. - mtr2) / (1. - mtr1)) - 1.
-            # Note: c04800 is filing unit's taxable income
-            sub = be_sub * pch * calc1.array('c04800')
+            sub = be_sub * pch * res1['c04800']
         # calculate magnitude of income effect
-        if be_inc == 0.0:
-            inc = np.zeros(calc1.array_len)
+        if np.all(be_inc == 0.0):
+            inc = np.zeros(res1['c04800'].shape)
         else:
             # dollar change in after-tax income
-            # Note: combined is f.unit's income+payroll tax liability
-            dch = calc1.array('combined') - calc2.array('combined')
+            dch = res1['combined'] - res2['combined']
             inc = be_inc * dch
         # calculate sum of substitution and income effects
         si_chg = sub + inc
     # Calculate long-term capital-gains effect
-    if be_cg == 0.0:
-        ltcg_chg = np.zeros(calc1.array_len)
+    if np.all(be_cg == 0.0):
+        ltcg_chg = np.zeros(res1['p23250'].shape)
     else:
-        # calculate marginal tax rates on long-term capital gains
-        #  p23250 is filing units' long-term capital gains
-        ltcg_mtr1, ltcg_mtr2 = _mtr12(calc1, calc2,
-                                      mtr_of='p23250',
-                                      tax_type='iitax')
-        rch = ltcg_mtr2 - ltcg_mtr1
+        rch = res2['ltcg_mtr'] - res1['ltcg_mtr']
         exp_term = np.exp(be_cg * rch)
-        new_ltcg = calc1.array('p23250') * exp_term
-        ltcg_chg = new_ltcg - calc1.array('p23250')
-    # Extract dataframe from calc1
-    if dump:
-        df1 = calc1.dataframe(dvars)
-        df1.drop('mtr_inctax', axis='columns', inplace=True)
-        df1.drop('mtr_paytax', axis='columns', inplace=True)
-        df1['mtr_combined'] = wage_mtr1 * 100
-    else:
-        df1 = calc1.dataframe(tc.DIST_VARIABLES)
-    del calc1
-    # Add behavioral-response changes to income sources
-    calc2_behv = copy.deepcopy(calc2)
-    del calc2
-    if not zero_sub_and_inc:
-        calc2_behv = _update_ordinary_income(si_chg, calc2_behv)
-    calc2_behv = _update_cap_gain_income(ltcg_chg, calc2_behv)
+        new_ltcg = res1['p23250'] * exp_term
+        ltcg_chg = new_ltcg - res1['p23250']
+    return (si_chg, ltcg_chg)
+
+
+def _update_ordinary_income(taxinc_change, calc):
+    """
+    Implement total taxable income change induced by behavioral response.
+    """
+    delta_winc, delta_oinc, delta_ided = _ordinary_income_changes(
+        taxinc_change, calc)
+    # add the three parts to different records variables embedded in calc
+    calc.incarray('e00200', delta_winc)
+    calc.incarray('e00200p', delta_winc)
+    calc.incarray('e00300', delta_oinc)
+    calc.incarray('e19200', delta_ided)
+    return calc
+
+
+def _ordinary_income_changes(taxinc_change, calc):
+    """
+    Return (delta_winc, delta_oinc, delta_ided) tuple containing the
+    allocation of the total taxable income change induced by behavioral
+    response to wages, other income and itemized deductions.
+    """
+    # compute AGI minus itemized deductions, agi_m_ided
+    agi = calc.array('c00100')
+    ided = np.where(calc.array('c04470') < calc.array('standard'),
+                    0., calc.array('c04470'))
+    agi_m_ided = agi - ided
+    # assume behv response only for filing units with positive agi_m_ided
+    pos = np.array(agi_m_ided > 0., dtype=bool)
+    delta_income = np.where(pos, taxinc_change, 0.)
+    # allocate delta_income into three parts
+    # pylint: disable=unsupported-assignment-operation
+    winc = calc.array('e00200')
+    delta_winc = np.zeros_like(agi)
+    delta_winc[pos] = delta_income[pos] * winc[pos] / agi_m_ided[pos]
+    oinc = agi - winc
+    delta_oinc = np.zeros_like(agi)
+    delta_oinc[pos] = delta_income[pos] * oinc[pos] / agi_m_ided[pos]
+    delta_ided = np.zeros_like(agi)
+    delta_ided[pos] = delta_income[pos] * ided[pos] / agi_m_ided[pos]
+    # confirm that the three parts are consistent with delta_income
+    assert np.allclose(delta_income, delta_winc + delta_oinc - delta_ided)
+    return (delta_winc, delta_oinc, delta_ided)
+
+
+def _compensation_factor(calc, earnings_var='e00200p'):
+    """
+    Return array of one plus the employer payroll tax rate on a marginal
+    dollar of earnings_var, which is the factor by which the marginal tax
+    rate on earnings computed by calc.mtr with wrt_full_compensation=True
+    must be multiplied to be a marginal tax rate per dollar of earnings.
+    (This factor is computed in the same way as in the calc.mtr method.)
+    """
+    earnings = calc.array(earnings_var)
+    oasdi_taxed = np.logical_or(
+        earnings < calc.policy_param('SS_Earnings_c'),
+        earnings >= calc.policy_param('SS_Earnings_thd'))
+    return 1.0 + np.where(oasdi_taxed,
+                          0.5 * (calc.policy_param('FICA_ss_trt') +
+                                 calc.policy_param('FICA_mc_trt')),
+                          0.5 * calc.policy_param('FICA_mc_trt'))
+
+
+def _crosses_kink(calc, taxinc_change, winc_change):
+    """
+    Return boolean array that is True for filing units whose taxable income
+    (changed by taxinc_change) crosses zero or an ordinary-income or
+    capital-gains tax bracket threshold or whose taxpayer earnings (changed
+    by winc_change) cross the social security maximum taxable earnings.
+    """
+    taxinc1 = calc.array('c04800')
+    taxinc2 = taxinc1 + taxinc_change
+    low = np.minimum(taxinc1, taxinc2)
+    high = np.maximum(taxinc1, taxinc2)
+    crosses = (low < 0.) & (high > 0.)
+    mars_index = calc.array('MARS') - 1
+    for param in ('II_brk1', 'II_brk2', 'II_brk3', 'II_brk4', 'II_brk5',
+                  'II_brk6', 'II_brk7', 'CG_brk1', 'CG_brk2', 'CG_brk3'):
+        threshold = np.asarray(calc.policy_param(param))[mars_index]
+        crosses |= (low < threshold) & (high > threshold)
+    earnings1 = calc.array('e00200p')
+    earnings2 = earnings1 + winc_change
+    threshold = calc.policy_param('SS_Earnings_c')
+    crosses |= ((np.minimum(earnings1, earnings2) < threshold) &
+                (np.maximum(earnings1, earnings2) > threshold))
+    return crosses
+
+
+def _update_cap_gain_income(cap_gain_change, calc):
+    """
+    Implement capital gain change induced by behavioral responses.
+    """
+    calc.incarray('p23250', cap_gain_change)
+    return calc
+
+
+def _reform_response(calc2, res1, res2, be_values, dvars, incremental=False,
+                     profile=None):
+    """
+    Add behavioral-response changes to calc2 using _add_responses and
+    return the DataFrame extracted from calc2 that contains the dvars
+    variables (or the DIST_VARIABLES when dvars is None).
+    """
+    # pylint: disable=too-many-arguments
+    calc2 = _add_responses(calc2, res1, res2, be_values, incremental,
+                           profile=profile)
+    # Extract dataframe from calc2
+    with _phase(profile, 'reform_dataframe'):
+        return _dataframe(calc2, dvars, res2['wage_mtr'])
+
+
+def _add_responses(calc2, res1, res2, be_values, incremental, profile=None):
+    """
+    Add behavioral-response changes implied by the be_values tuple of
+    elasticities to the income sources in calc2 (which is modified in
+    place) and recalculate post-reform taxes (for all filing units or, when
+    incremental is True, for only those with changed income), returning
+    calc2.
+    """
+    # pylint: disable=too-many-arguments
+    with _phase(profile, 'add_responses'):
+        si_chg, ltcg_chg = _income_changes(res1, res2, *be_values)
+        # Add behavioral-response changes to income sources
+        if si_chg is not None:
+            calc2 = _update_ordinary_income(si_chg, calc2)
+        calc2 = _update_cap_gain_income(ltcg_chg, calc2)
     # Recalculate post-reform taxes incorporating behavioral responses
-    calc2_behv.calc_all()
-    # Extract dataframe from calc2_behv
-    if dump:
-        df2 = calc2_behv.dataframe(dvars)
-        df2.drop('mtr_inctax', axis='columns', inplace=True)
-        df2.drop('mtr_paytax', axis='columns', inplace=True)
-        df2['mtr_combined'] = wage_mtr2 * 100
-    else:
-        df2 = calc2_behv.dataframe(tc.DIST_VARIABLES)
-    del calc2_behv
-    # Return the two dataframes
+    with _phase(profile, 'response_calc_all'):
+        if incremental:
+            changed = ltcg_chg != 0.
+            if si_chg is not None:
+                changed |= si_chg != 0.
+            _calc_all_subset(calc2, np.flatnonzero(changed))
+        else:
+            calc2.calc_all()
+    return calc2
+
+
+def _many_reform_response(calc_2, state):
+    """
+    Return reform DataFrame for calc_2 using the state of the response_many
+    function, which contains the pre-response baseline results.
+    """
+    assert isinstance(calc_2, tc.Calculator)
+    calc2 = _copy_calc(calc_2, state['lowcopy'])
+    res2 = _calc_all_and_mtrs(calc2, state['wage_mtr'], state['ltcg_mtr'])
+    assert calc2.array_len == state['array_len']
+    assert calc2.current_year == state['current_year']
+    return _reform_response(calc2, state['res1'], res2, state['be_values'],
+                            state['dvars'], state['incremental'])
+
+
+def _many_worker(calc_index):
+    """
+    Return reform DataFrame for the Calculator object at calc_index in the
+    state of the response_many function inherited by a worker process.
+    """
+    state = _WORKER_STATE
+    return _many_reform_response(state['calc_2_list'][calc_index], state)
+
+
+def _years_worker(year):
+    """
+    Return response function results for the specified year using the state
+    of the response_years function inherited by a worker process.
+    """
+    state = _WORKER_STATE
+    calc1 = copy.deepcopy(state['calc_1'])
+    calc2 = copy.deepcopy(state['calc_2'])
+    calc1.advance_to_year(year)
+    calc2.advance_to_year(year)
+    return response(calc1, calc2, state['elasticities'], dump=state['dump'],
+                    lowcopy=True, incremental=state['incremental'])
+
+
+def _chunk_response(chunk, state):
+    """
+    Return response function results for the filing units in the
+    (start, stop) chunk using the state of the response_chunks function.
+    """
+    index = np.arange(*chunk)
+    calc1 = _subset_calc(state['calc_1'], index)
+    calc2 = _subset_calc(state['calc_2'], index)
+    df1, df2 = response(calc1, calc2,
+                        _subset_elasticities(state['be_values'], index),
+                        dump=state['dump'], lowcopy=True,
+                        incremental=state['incremental'])
+    df1.index = index
+    df2.index = index
     return (df1, df2)
 
 
+def _chunk_worker(chunk):
+    """
+    Return response function results for the filing units in the
+    (start, stop) chunk using the state of the response_chunks function
+    inherited by a worker process.
+    """
+    return _chunk_response(chunk, _WORKER_STATE)
+
+
+def _pool_results(pool, func, args, window):
+    """
+    Generator that submits func(arg) for each arg in args to the pool and
+    yields the results in args order, while keeping no more than window
+    submitted tasks whose results have not yet been yielded; the pool is
+    shut down when the generator finishes or is closed.
+    """
+    with pool:
+        pending = collections.deque()
+        for arg in args:
+            pending.append(pool.submit(func, arg))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _grid_worker(be_values):
+    """
+    Return reform DataFrame for the be_values tuple of elasticities using
+    the state of the response_grid function inherited by a worker process.
+    """
+    state = _WORKER_STATE
+    return _reform_response(_copy_calc(state['calc2'], state['lowcopy']),
+                            _scenario_mtrs(state['res1'], be_values),
+                            _scenario_mtrs(state['res2'], be_values),
+                            be_values, state['dvars'], state['incremental'])
+
+
+def _scenario_mtrs(res, be_values):
+    """
+    Return copy of the res dictionary of _calc_all_and_mtrs results in which
+    the marginal tax rates that are not needed by the be_values tuple of
+    elasticities are replaced by arrays of zeros, as they are when the
+    response function is called with those elasticities.
+    """
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    res = dict(res)
+    if not wage_mtr:
+        res['wage_mtr'] = np.zeros_like(res['wage_mtr'])
+    if not ltcg_mtr:
+        res['ltcg_mtr'] = np.zeros_like(res['ltcg_mtr'])
+    return res
+
+
+# state dictionary inherited by the worker processes of _process_pool
+_WORKER_STATE = dict()
+
+
+def _set_worker_state(state):
+    """
+    Store state dictionary in a worker process created by _process_pool.
+    """
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def _process_pool(n_jobs, state):
+    """
+    Return ProcessPoolExecutor with n_jobs worker processes, each of which
+    has the state dictionary stored in its _WORKER_STATE dictionary.
+    The worker processes are forked, so the state dictionary is not pickled
+    and can contain Calculator objects (whose Policy objects are unpicklable).
+    Raises ValueError when the fork start method is unavailable (as it is
+    on Windows).
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise ValueError('n_jobs > 1 requires the fork start method of '
+                         'worker processes, which is unavailable on this '
+                         'platform; use n_jobs=1')
+    return ProcessPoolExecutor(max_workers=n_jobs,
+                               mp_context=multiprocessing.get_context('fork'),
+                               initializer=_set_worker_state,
+                               initargs=(state,))
+
+
+def _subset_calc(calc, index):
+    """
+    Return Calculator object whose Records object contains only the filing
+    units in calc at the positions in the index array.  The returned object
+    shares the Policy and Consumption objects of calc, but not any records
+    arrays, and should not be advanced to another year.
+    """
+    # pylint: disable=protected-access
+    records = copy.copy(calc._Calculator__records)
+    for var in records.USABLE_READ_VARS | records.CALCULATED_VARS:
+        value = getattr(records, var)
+        if isinstance(value, np.ndarray):
+            setattr(records, var, value[index])
+        else:  # s006 is a Pandas Series
+            setattr(records, var, value.iloc[index])
+    records._Data__dim = len(index)
+    records._Data__index = records._Data__index[index]
+    subset = copy.copy(calc)
+    subset._Calculator__records = records
+    return subset
+
+
+def _dedup_calcs(calc_1, calc_2, extra_columns=()):
+    """
+    Return (calc1, calc2, index, inverse) tuple where calc1 and calc2
+    contain one filing unit for each group of filing units in calc_1 and
+    calc_2 whose tax-relevant input variables (and values in each of the
+    extra_columns arrays) are identical in both, with s006 equal to the
+    group's total weight, where index contains the position in calc_1 and
+    calc_2 of each filing unit in calc1 and calc2, and where inverse
+    contains the position in calc1 and calc2 of each filing unit in calc_1
+    and calc_2.  When there are no identical filing units, calc_1, calc_2,
+    None and None are returned.
+    """
+    # pylint: disable=too-many-locals,protected-access
+    assert calc_1.array_len == calc_2.array_len
+    records = calc_1._Calculator__records
+    key_vars = sorted(records.USABLE_READ_VARS - set(DEDUP_IGNORED_VARS) -
+                      set(['s006']))
+    columns = list()
+    for var in key_vars:
+        value1 = np.asarray(calc_1.array(var))
+        value2 = np.asarray(calc_2.array(var))
+        columns.append(value1)
+        if value2 is not value1 and not np.array_equal(value1, value2):
+            columns.append(value2)
+    columns.extend(extra_columns)
+    # hash the bit patterns of the key columns of each filing unit
+    hashes = np.zeros(calc_1.array_len, dtype=np.uint64)
+    prime = np.uint64(1099511628211)  # the 64-bit FNV prime
+    for column in columns:
+        bits = np.ascontiguousarray(column, dtype=np.float64).view(np.uint64)
+        hashes = (hashes ^ bits) * prime
+    _, first, inverse = np.unique(hashes, return_index=True,
+                                  return_inverse=True)
+    # order the groups by their first filing unit
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    index = first[order]
+    inverse = rank[inverse.ravel()]
+    # separate the filing units whose hashes collide with those of
+    # different filing units (or whose inputs are not numbers)
+    mismatch = np.zeros(calc_1.array_len, dtype=bool)
+    for column in columns:
+        mismatch |= column != column[index[inverse]]
+    if mismatch.any():
+        extra = np.flatnonzero(mismatch)
+        inverse[extra] = index.size + np.arange(extra.size)
+        index = np.concatenate([index, extra])
+    if index.size == calc_1.array_len:
+        return (calc_1, calc_2, None, None)
+    weight = np.bincount(inverse, weights=np.asarray(calc_1.array('s006')),
+                         minlength=index.size)
+    calcs = list()
+    for calc in (calc_1, calc_2):
+        subset = _subset_calc(calc, index)
+        records = subset._Calculator__records
+        records.s006 = pd.Series(weight, index=records.s006.index,
+                                 name=records.s006.name)
+        calcs.append(subset)
+    return (calcs[0], calcs[1], index, inverse)
+
+
+def _expand_dataframe(dframe, inverse, calc):
+    """
+    Return DataFrame containing the row of dframe at each position in
+    inverse, with the s006 and DEDUP_IGNORED_VARS variables in dframe
+    replaced by their values in calc.
+    """
+    expanded = dframe.iloc[inverse].reset_index(drop=True)
+    for var in ('s006',) + DEDUP_IGNORED_VARS:
+        if var in expanded.columns:
+            expanded[var] = np.asarray(calc.array(var),
+                                       dtype=expanded[var].dtype)
+    return expanded
+
+
+def _calc_all_subset(calc, index):
+    """
+    Recalculate taxes for only the filing units at the positions in the
+    index array, leaving the calculated variables for the other filing units
+    unchanged, so the result is the same as a calc.calc_all() call when
+    calc has already had calc_all() executed and only the input variables
+    of the filing units in the index array have been changed since then.
+    """
+    if index.size == 0:
+        return
+    subset = _subset_calc(calc, index)
+    subset.calc_all()
+    # pylint: disable=protected-access
+    for var in subset._Calculator__records.CALCULATED_VARS:
+        calc.array(var)[index] = subset.array(var)
+    del subset
+
+
+def _cached_baseline(cache, key, calc_1, wage_mtr, ltcg_mtr, dvars):
+    """
+    Return (res1, df1) tuple containing the pre-response baseline results
+    and DataFrame for calc_1 loaded from the cache entry with the specified
+    key, both of which are None when cache is None or when the results are
+    not in the cache.
+    """
+    # pylint: disable=too-many-arguments
+    if cache is None:
+        return (None, None)
+    assert isinstance(cache, BaselineCache)
+    names = set(['c04800', 'combined', 'p23250'])
+    if wage_mtr:
+        names.add('wage_mtr')
+    if ltcg_mtr:
+        names.add('ltcg_mtr')
+    names.update(tc.DIST_VARIABLES if dvars is None else dvars)
+    arrays = cache.load(key, names)
+    if arrays is None:
+        return (None, None)
+    res1 = {var: arrays[var] for var in ('c04800', 'combined', 'p23250')}
+    for mtr_name, computed in (('wage_mtr', wage_mtr),
+                               ('ltcg_mtr', ltcg_mtr)):
+        if computed:
+            res1[mtr_name] = arrays[mtr_name]
+        else:
+            res1[mtr_name] = np.zeros(calc_1.array_len)
+    varlist = tc.DIST_VARIABLES if dvars is None else dvars
+    df1 = pd.DataFrame(data=np.column_stack([arrays[var]
+                                             for var in varlist]),
+                       columns=varlist)
+    if dvars is not None:
+        df1 = _dump_dataframe(df1, res1['wage_mtr'])
+    return (res1, df1)
+
+
+def _store_baseline(cache, key, calc1, res1, dvars, wage_mtr, ltcg_mtr):
+    """
+    Store in the cache the pre-response baseline results in res1 and the
+    calc1 variables used to construct the baseline DataFrame.  The marginal
+    tax rates that were not computed (as specified by wage_mtr and
+    ltcg_mtr) are zero placeholders in res1, which are not stored, so that
+    a later load that needs them is a cache miss.
+    """
+    # pylint: disable=too-many-arguments
+    arrays = {var: calc1.array(var)
+              for var in (tc.DIST_VARIABLES if dvars is None else dvars)}
+    arrays.update(res1)
+    for mtr_name, computed in (('wage_mtr', wage_mtr),
+                               ('ltcg_mtr', ltcg_mtr)):
+        if not computed:
+            del arrays[mtr_name]
+    cache.store(key, arrays)
+
+
+def _add_aggregates(results, name, calc, variables, weight, decile):
+    """
+    Add to the results dictionary the weighted totals of the variables in
+    calc using the name key and, when decile is not None, the weighted
+    decile totals of the variables using the name + '_deciles' key.
+    """
+    # pylint: disable=too-many-arguments
+    results[name] = {var: float(np.dot(calc.array(var), weight))
+                     for var in variables}
+    if decile is not None:
+        results[name + '_deciles'] = {
+            var: np.bincount(decile, weights=calc.array(var) * weight,
+                             minlength=10)
+            for var in variables
+        }
+
+
+def _decile_index(income, weight):
+    """
+    Return integer array containing the decile (from 0 to 9) of each filing
+    unit when filing units are ranked by income and each decile contains
+    one-tenth of the total weight.
+    """
+    order = np.argsort(income, kind='mergesort')
+    cum_weight = np.cumsum(weight[order])
+    decile = np.empty(income.size, dtype=np.int64)
+    decile[order] = np.clip(
+        np.ceil(10. * cum_weight / cum_weight[-1]).astype(np.int64) - 1, 0, 9)
+    return decile
+
+
+def _dump_variables():
+    """
+    Return list of all Tax-Calculator input and calculated variables.
+    """
+    recs_vinfo = tc.Records(data=None)  # contains records VARINFO only
+    return list(recs_vinfo.USABLE_READ_VARS | recs_vinfo.CALCULATED_VARS)
+
+
+def _dataframe(calc, dvars, wage_mtr):
+    """
+    Return DataFrame extracted from calc containing the dvars variables,
+    with mtr_combined (computed from wage_mtr) replacing mtr_inctax and
+    mtr_paytax, or containing the DIST_VARIABLES when dvars is None.
+    """
+    if dvars is None:
+        return calc.dataframe(tc.DIST_VARIABLES)
+    return _dump_dataframe(calc.dataframe(dvars), wage_mtr)
+
+
+def _dump_dataframe(dframe, wage_mtr):
+    """
+    Return dframe containing dump variables after replacing its mtr_inctax
+    and mtr_paytax variables with mtr_combined computed from wage_mtr.
+    """
+    dframe.drop('mtr_inctax', axis='columns', inplace=True)
+    dframe.drop('mtr_paytax', axis='columns', inplace=True)
+    dframe['mtr_combined'] = wage_mtr * 100
+    return dframe
+
+
 def pch_response(elasticity=np.zeros(1),
                  val1=np.zeros(1),
-                 val2=np.zeros(1)):
+                 val2=np.zeros(1),
+                 out=None, dtype=None):
     """
     Calculate the percentage change response, given an elasticity and
     original/new values. Can be used to calculate substitution or
@@ -261,15 +1489,29 @@ def pch_response(elasticity=np.zeros(1),
     val2: value or numpy array representing new value(s).
         Defaults to zero.
 
+    out: numpy array or None
+        array in which the result is stored and which is returned, whose
+        shape must be the broadcast shape of the other arguments.
+        Default value of None implies a new array is returned.
+
+    dtype: numpy float64 or float32 dtype or None
+        floating-point type in which the response is computed.
+        Default value of None implies float64 unless all the other
+        arguments are float32.
+
     Returns
     -------
     pch_response: numpy array
         Percentage change in the response, calculated essentially as:
         elasticity * (val2 / val1 - 1).
+
+    Notes
+    -----
+    The response is computed by a fused kernel in a single pass over the
+    arguments without allocating any intermediate arrays.
     """
-    val1 = np.where(val1 == 0, np.nan, val1)  # Avoids a warning.
-    pch = np.where(np.isnan(val1), 0, val2 / val1 - 1.)
-    return elasticity * pch
+    return apply_kernel(pch_kernel, (elasticity, val1, val2),
+                        out=out, dtype=dtype)
 
 
 def quantity_response(quantity=np.array([1]),
@@ -278,7 +1520,8 @@ def quantity_response(quantity=np.array([1]),
                       aftertax_price2=np.zeros(1),
                       income_elasticity=np.zeros(1),
                       aftertax_income1=np.zeros(1),
-                      aftertax_income2=np.zeros(1)):
+                      aftertax_income2=np.zeros(1),
+                      out=None, dtype=None, scenarios=False):
     """
     Calculate dollar change in quantity using a log-log response equation,
     which assumes that the proportional change in the quantity is equal to
@@ -338,21 +1581,62 @@ def quantity_response(quantity=np.array([1]),
           or small incomes to be somewhat larger in order to avoid extreme
           proportional changes in aftertax income. Defaults to 0.
 
+    out: numpy array or None
+        array in which the result is stored and which is returned, whose
+        shape must be the broadcast shape of the other arguments.
+        Default value of None implies a new array is returned.
+
+    dtype: numpy float64 or float32 dtype or None
+        floating-point type in which the response is computed.
+        Default value of None implies float64 unless all the other
+        arguments are float32.
+
+    scenarios: boolean
+        whether or not the elasticity arguments have a leading scenario
+        axis, in which case each elasticity argument is a float, a numpy
+        array of shape (S,) containing one elasticity for each of S
+        scenarios, or a numpy array of shape (S, N) containing elasticities
+        for each of the N records in each scenario (with at least one
+        elasticity argument being an array), the other arguments are floats
+        or numpy arrays of shape (N,), and the returned response is a numpy
+        array of shape (S, N).  Default value of False implies there is no
+        scenario axis.
+
     Returns
     -------
     response: numpy array
         dollar change in quantity calculated from log-log response equation
+
+    Notes
+    -----
+    The response is computed by a fused kernel in a single pass over the
+    arguments without allocating any intermediate arrays, which produces
+    exactly the same float64 results as calling pch_response for the
+    substitution and income effects.  When scenarios=True, the proportional
+    changes in aftertax price and income, which do not depend on the
+    elasticities, are computed once (as the only intermediate arrays) and
+    the response of each scenario is exactly the same as the response
+    computed with that scenario's elasticities when scenarios=False.
     """
     # pylint: disable=too-many-arguments
-    substitution_effect = pch_response(
-        price_elasticity,
-        np.maximum(aftertax_price1, 0.01),
-        np.maximum(aftertax_price2, 0.01))
-    income_effect = pch_response(
-        income_elasticity,
-        np.maximum(aftertax_income1, 1.0),
-        np.maximum(aftertax_income2, 1.0))
-    return quantity * (substitution_effect + income_effect)
+    if scenarios:
+        return _scenario_response(
+            quantity,
+            price_elasticity,
+            apply_kernel(floor_pch_kernel,
+                         (aftertax_price1, aftertax_price2, 0.01),
+                         dtype=dtype),
+            income_elasticity,
+            apply_kernel(floor_pch_kernel,
+                         (aftertax_income1, aftertax_income2, 1.0),
+                         dtype=dtype),
+            out, dtype)
+    return apply_kernel(quantity_kernel,
+                        (quantity, price_elasticity,
+                         aftertax_price1, aftertax_price2,
+                         income_elasticity,
+                         aftertax_income1, aftertax_income2),
+                        out=out, dtype=dtype)
 
 
 def labor_response(earnings=np.array([1]),
@@ -361,7 +1645,8 @@ def labor_response(earnings=np.array([1]),
                    mtr2=np.zeros(1),
                    income_elasticity=np.zeros(1),
                    aftertax_income1=np.zeros(1),
-                   aftertax_income2=np.zeros(1)):
+                   aftertax_income2=np.zeros(1),
+                   out=None, dtype=None, scenarios=False):
     """
     Calculate labor response given earnings, substitution elasticity of taxable
     income, initial and new marginal tax rates, income elasticity, and initial
@@ -409,17 +1694,78 @@ def labor_response(earnings=np.array([1]),
           or small incomes to be somewhat larger in order to avoid extreme
           proportional changes in aftertax income. Defaults to 0.
 
+    out: numpy array or None
+        array in which the result is stored and which is returned, whose
+        shape must be the broadcast shape of the other arguments.
+        Default value of None implies a new array is returned.
+
+    dtype: numpy float64 or float32 dtype or None
+        floating-point type in which the response is computed.
+        Default value of None implies float64 unless all the other
+        arguments are float32.
+
+    scenarios: boolean
+        whether or not the elasticity arguments have a leading scenario
+        axis, in which case each elasticity argument is a float, a numpy
+        array of shape (S,) containing one elasticity for each of S
+        scenarios, or a numpy array of shape (S, N) containing elasticities
+        for each of the N records in each scenario (with at least one
+        elasticity argument being an array), the other arguments are floats
+        or numpy arrays of shape (N,), and the returned response is a numpy
+        array of shape (S, N).  Default value of False implies there is no
+        scenario axis.
+
     Returns
     -------
     response: numpy array
         dollar change in earnings calculated from log-log response equation
+
+    Notes
+    -----
+    The response is computed by a fused kernel in a single pass over the
+    arguments without allocating any intermediate arrays (including the
+    aftertax prices 1 - mtr1 and 1 - mtr2 passed to quantity_response).
+    When scenarios=True, the proportional changes in aftertax price and
+    income are computed once, as in the quantity_response function.
+    """
+    # pylint: disable=too-many-arguments
+    if scenarios:
+        return _scenario_response(
+            earnings,
+            substitution_eti,
+            apply_kernel(mtr_pch_kernel, (mtr1, mtr2, 0.01), dtype=dtype),
+            income_elasticity,
+            apply_kernel(floor_pch_kernel,
+                         (aftertax_income1, aftertax_income2, 1.0),
+                         dtype=dtype),
+            out, dtype)
+    return apply_kernel(labor_kernel,
+                        (earnings, substitution_eti, mtr1, mtr2,
+                         income_elasticity,
+                         aftertax_income1, aftertax_income2),
+                        out=out, dtype=dtype)
+
+
+def _scenario_response(quantity, price_elasticity, price_pch,
+                       income_elasticity, income_pch, out, dtype):
     """
-    return quantity_response(
-        quantity=earnings,
-        price_elasticity=substitution_eti,
-        aftertax_price1=1 - mtr1,
-        aftertax_price2=1 - mtr2,
-        income_elasticity=income_elasticity,
-        aftertax_income1=aftertax_income1,
-        aftertax_income2=aftertax_income2
-    )
+    Return (S, N) array of quantity responses computed from the per-record
+    quantity and proportional changes in price and income, which have shape
+    (N,), and the price and income elasticities, each of which is a float
+    or has shape (S,) or (S, N), with an elasticity of shape (S,) being
+    broadcast to all N records.
+    """
+    # pylint: disable=too-many-arguments
+    assert np.ndim(quantity) <= 1
+    elasticities = list()
+    for elasticity in (price_elasticity, income_elasticity):
+        elasticity = np.asarray(elasticity)
+        if elasticity.ndim == 1:
+            elasticity = elasticity[:, np.newaxis]
+        assert elasticity.ndim in (0, 2)
+        elasticities.append(elasticity)
+    assert max(elasticity.ndim for elasticity in elasticities) == 2
+    return apply_kernel(scenario_kernel,
+                        (quantity, elasticities[0], price_pch,
+                         elasticities[1], income_pch),
+                        out=out, dtype=dtype)
@@ -0,0 +1,182 @@
+"""
+Persistent on-disk cache of pre-response baseline results.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle cache.py
+# pylint --disable=locally-disabled cache.py
+
+import os
+import shutil
+import hashlib
+import uuid
+import numpy as np
+import taxcalc as tc
+
+
+# name prefix of the temporary files written while a cache entry is stored
+TEMP_PREFIX = '.tmp-'
+
+
+class BaselineCache():
+    """
+    Constructor for the BaselineCache class, which stores pre-response
+    baseline results (records variables and marginal tax rate arrays)
+    as .npy files in a cache directory, so that they can be shared by
+    several processes and reused after a process restarts.
+
+    Parameters
+    ----------
+    path: string
+        name of cache directory, which is created if it does not exist.
+
+    max_bytes: integer or None
+        maximum total size of the cached .npy files, which is enforced
+        after each store by evicting least-recently-used cache entries.
+        Default value of None implies no size limit.
+
+    Returns
+    -------
+    class instance: BaselineCache
+
+    Notes
+    -----
+    Each cache entry is a subdirectory whose name is the key computed by
+    the key method from the content of a Calculator object's records,
+    policy parameters, consumption parameters and current year (and the
+    Tax-Calculator version), and each cached array is stored in its own
+    .npy file in that subdirectory.  Each .npy file is written under a
+    temporary name and then renamed, so concurrent writers (which write
+    the same content for the same key) never leave a partial file, and
+    cached arrays are loaded as read-only memory-mapped arrays.
+    """
+
+    def __init__(self, path, max_bytes=None):
+        assert isinstance(path, str)
+        assert max_bytes is None or max_bytes > 0
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(calc):
+        """
+        Return cache key for Calculator object calc, which is a hash of
+        the content of its records, policy and consumption parameters for
+        its current year.
+        """
+        assert isinstance(calc, tc.Calculator)
+        # pylint: disable=protected-access
+        records = calc._Calculator__records
+        policy = calc._Calculator__policy
+        consumption = calc._Calculator__consumption
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update('{} {}'.format(tc.__version__,
+                                     calc.current_year).encode())
+        for var in sorted(records.USABLE_READ_VARS):
+            _update_hash(hasher, var, getattr(records, var))
+        for param in sorted(policy.keys()):
+            _update_hash(hasher, param, calc.policy_param(param))
+        for param in sorted(consumption.keys()):
+            _update_hash(hasher, param, calc.consump_param(param))
+        return hasher.hexdigest()
+
+    def load(self, key, names):
+        """
+        Return dictionary containing a read-only memory-mapped array for
+        each of the names in the cache entry with the specified key, or
+        return None if any of the names are not in that cache entry.
+        """
+        entry = os.path.join(self.path, key)
+        arrays = dict()
+        try:
+            for name in names:
+                arrays[name] = np.load(os.path.join(entry, name + '.npy'),
+                                       mmap_mode='r')
+            os.utime(entry)  # mark entry as recently used
+        except (FileNotFoundError, ValueError):
+            return None
+        return arrays
+
+    def store(self, key, arrays):
+        """
+        Store each array in the arrays dictionary in the cache entry with
+        the specified key and then evict least-recently-used cache entries
+        until the total cache size is no more than max_bytes.
+        """
+        entry = os.path.join(self.path, key)
+        for name, value in arrays.items():
+            _store_array(entry, name, value)
+        os.makedirs(entry, exist_ok=True)
+        os.utime(entry)
+        if self.max_bytes is not None:
+            self._evict(keep=key)
+
+    def clear(self):
+        """
+        Remove all cache entries.
+        """
+        for key in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+
+    def _evict(self, keep):
+        """
+        Remove least-recently-used cache entries, other than the keep entry
+        and the entries that are being stored by any process (which contain
+        temporary files), until the total cache size is no more than
+        max_bytes.
+        """
+        entries = list()
+        total_bytes = 0
+        for key in os.listdir(self.path):
+            entry = os.path.join(self.path, key)
+            try:
+                entry_files = list(os.scandir(entry))
+                size = sum(entry_file.stat().st_size
+                           for entry_file in entry_files)
+                storing = any(entry_file.name.startswith(TEMP_PREFIX)
+                              for entry_file in entry_files)
+                entries.append((os.stat(entry).st_mtime, size, key, storing))
+            except FileNotFoundError:  # removed by another process
+                continue
+            total_bytes += size
+        for _, size, key, storing in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep or storing:
+                continue
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+            total_bytes -= size
+
+
+def _store_array(entry, name, value, attempts=3):
+    """
+    Write value to the name.npy file in the entry directory, first to a
+    temporary file that is then renamed.  An entry containing a temporary
+    file is never evicted, but another process can evict the entry just
+    before the temporary file is created, in which case the entry directory
+    is recreated and the write is retried.
+    """
+    for attempt in range(attempts):
+        os.makedirs(entry, exist_ok=True)
+        tmp_name = os.path.join(entry, '{}{}.{}.npy'.format(
+            TEMP_PREFIX, name, uuid.uuid4().hex))
+        try:
+            np.save(tmp_name, np.asarray(value))
+            os.replace(tmp_name, os.path.join(entry, name + '.npy'))
+            return
+        except FileNotFoundError:  # entry evicted by another process
+            if attempt == attempts - 1:
+                raise
+
+
+def _update_hash(hasher, name, value):
+    """
+    Update hasher with the name and content of the specified value.
+    """
+    value = np.asarray(value)
+    hasher.update('{} {} {}'.format(name, value.dtype,
+                                    value.shape).encode())
+    if value.dtype.hasobject:
+        hasher.update(repr(value.tolist()).encode())
+    else:
+        hasher.update(np.ascontiguousarray(value).tobytes())
@@ -0,0 +1,335 @@
+"""
+Command-line interface (CLI) to the Behavioral-Responses logic, which runs
+the cross-product of reforms, elasticities and years.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle cli.py
+# pylint --disable=locally-disabled cli.py
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+from behresp.behavior import (response_grid, _elasticity_values,
+                              _process_pool, _WORKER_STATE)
+from behresp.dump import response_dump
+
+
+AGGREGATE_VARIABLES = ['iitax', 'payrolltax', 'combined', 'c04800']
+
+
+def cli_main(arguments=None):
+    """
+    Contains command-line interface (CLI) to the Behavioral-Responses logic,
+    which is installed as the behresp console script, and returns the exit
+    status.  The arguments list defaults to the command-line arguments.
+
+    Each cell of the cross-product of the reform files, the elasticities
+    dictionaries and the years is scored, and the weighted totals of the
+    aggregate variables in the baseline and in the reform (incorporating
+    the behavioral responses) are written to the cells/REFORM/ELASTICITIES
+    /YEAR.json file in the output directory, where REFORM is the name of
+    the reform file without its .json extension and ELASTICITIES is the
+    name of the elasticities dictionary.  When --dump is specified, the
+    per-record dump output of each cell is also written to the dumps/
+    REFORM/ELASTICITIES/YEAR directory by the response_dump function.
+    Each cell file is written only after the cell's work has finished, so
+    a rerun with the same output directory (for example, after a crash)
+    skips the cells whose files exist, unless the inputs of the cell have
+    changed since its file was written.  Changes are detected using a hash
+    (written in the cell file) of the resolved path, size and modification
+    time of the input data file and of the contents of the baseline, the
+    reform and the elasticities dictionary.  After all cells have been
+    scored, the aggregates.csv file in the output directory contains the
+    results of all the cells.
+
+    The elasticities file contains a JSON object that is either one
+    response function elasticities dictionary, which is named default, or
+    an object whose members are named elasticities dictionaries.  The
+    reform and baseline files are Tax-Calculator JSON reform files, each
+    of which is implemented on current-law policy.
+    """
+    # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(
+        prog='behresp',
+        description=('Writes to the OUTDIR directory the aggregate results '
+                     '(and optionally the per-record dump output) of the '
+                     'behavioral-response logic for each combination of '
+                     'reform, elasticities and year, skipping the '
+                     'combinations whose results were written by an '
+                     'earlier run.'))
+    parser.add_argument('--data', required=True,
+                        help=('cps for the CPS input data included in '
+                              'Tax-Calculator or name of a CSV input data '
+                              'file, which is read as CPS data when its '
+                              'name ends with cps.csv.'))
+    parser.add_argument('--baseline', default=None,
+                        help=('name of baseline-policy JSON reform file; '
+                              'default is current-law policy.'))
+    parser.add_argument('--reforms', nargs='+', required=True,
+                        help='names of reform-policy JSON reform files.')
+    parser.add_argument('--elasticities', required=True,
+                        help='name of JSON elasticities file.')
+    parser.add_argument('--years', required=True,
+                        help='tax year (YEAR) or range of years (FIRST-LAST).')
+    parser.add_argument('--outdir', required=True,
+                        help='name of output directory.')
+    parser.add_argument('--n-jobs', type=int, default=1, dest='n_jobs',
+                        help=('maximum number of worker processes, each of '
+                              'which scores one reform and year at a time; '
+                              'default is 1.'))
+    parser.add_argument('--variables', nargs='+', default=AGGREGATE_VARIABLES,
+                        choices=tc.DIST_VARIABLES, metavar='VARIABLE',
+                        help=('aggregate variables; default is {}.'.format(
+                            ' '.join(AGGREGATE_VARIABLES))))
+    parser.add_argument('--dump', action='store_true',
+                        help='write per-record dump output of each cell.')
+    args = parser.parse_args(arguments)
+    try:
+        years = _years(args.years)
+        elasticities = _read_elasticities(args.elasticities)
+        reforms = {_name(path): tc.Policy.read_json_reform(path)
+                   for path in args.reforms}
+        assert len(reforms) == len(args.reforms), 'duplicate reform names'
+        baseline = (dict() if args.baseline is None else
+                    tc.Policy.read_json_reform(args.baseline))
+        assert args.n_jobs >= 1, '--n-jobs must be positive'
+        records = _records(args.data)
+        data = _data_identity(args.data)
+    except (AssertionError, KeyError, OSError, ValueError) as err:
+        sys.stderr.write('ERROR: {}\n'.format(err))
+        return 1
+    state = {'records': records,
+             'data': data,
+             'baseline': baseline,
+             'reforms': reforms,
+             'elasticities': elasticities,
+             'variables': args.variables,
+             'dump': args.dump,
+             'outdir': os.path.abspath(args.outdir)}
+    # group the cells that have not been scored by reform and year
+    units = list()
+    for reform_name in reforms:
+        for year in years:
+            pending = [name for name in elasticities
+                       if not _cell_done(state, reform_name, name, year)]
+            if pending:
+                units.append((reform_name, year, pending))
+    ncells = len(reforms) * len(years) * len(elasticities)
+    sys.stdout.write('scoring {} of {} cells\n'.format(
+        sum(len(pending) for _, _, pending in units), ncells))
+    if args.n_jobs == 1 or len(units) <= 1:
+        for unit in units:
+            _score_unit(unit, state)
+    else:
+        with _process_pool(min(args.n_jobs, len(units)), state) as pool:
+            list(pool.map(_unit_worker, units))
+    _write_aggregates(state, years)
+    return 0
+
+
+def _years(text):
+    """
+    Return list of years specified by YEAR or FIRST-LAST text.
+    """
+    first, _, last = text.partition('-')
+    first = int(first)
+    last = int(last) if last else first
+    assert first <= last, 'first year {} after last year {}'.format(first,
+                                                                    last)
+    return list(range(first, last + 1))
+
+
+def _read_elasticities(path):
+    """
+    Return dictionary of named elasticities dictionaries read from the JSON
+    elasticities file.
+    """
+    with open(path) as jfile:
+        content = json.load(jfile)
+    assert isinstance(content, dict), 'elasticities must be a JSON object'
+    if set(content) <= set(('sub', 'inc', 'cg', 'group')):
+        content = {'default': content}
+    for elasticities in content.values():
+        _elasticity_values(elasticities)
+    return content
+
+
+def _name(path):
+    """
+    Return file name without its directory and .json extension.
+    """
+    name = os.path.basename(path)
+    if name.endswith('.json'):
+        name = name[:-len('.json')]
+    return name
+
+
+def _records(data):
+    """
+    Return Records object containing the specified input data, which is
+    read as CPS data when the file name ends with cps.csv (as in the
+    Tax-Calculator tc CLI).
+    """
+    if data == 'cps':
+        return tc.Records.cps_constructor()
+    if data.endswith('cps.csv'):
+        return tc.Records.cps_constructor(data=data)
+    return tc.Records(data=data)
+
+
+def _data_identity(data):
+    """
+    Return list identifying the input data, which contains the resolved
+    path, size and modification time of the input data file (or the
+    Tax-Calculator version for the CPS input data included in it).
+    """
+    if data == 'cps':
+        return [data, tc.__version__]
+    stat = os.stat(data)
+    return [os.path.realpath(data), stat.st_size, stat.st_mtime_ns]
+
+
+def _calculator(state, reform, year):
+    """
+    Return Calculator object for reform (implemented on current-law policy)
+    and the input data advanced to year.
+    """
+    policy = tc.Policy()
+    policy.implement_reform(reform)
+    calc = tc.Calculator(records=state['records'], policy=policy)
+    calc.advance_to_year(year)
+    return calc
+
+
+def _cell_path(state, reform_name, elasticities_name, year, kind='cells'):
+    """
+    Return name of the cell file (or dump directory when kind is 'dumps').
+    """
+    path = os.path.join(state['outdir'], kind, reform_name,
+                        elasticities_name, str(year))
+    if kind == 'cells':
+        path += '.json'
+    return path
+
+
+def _cell_done(state, reform_name, elasticities_name, year):
+    """
+    Return True if the cell file exists and contains the results requested
+    in state, and False otherwise.
+    """
+    path = _cell_path(state, reform_name, elasticities_name, year)
+    if not os.path.isfile(path):
+        return False
+    with open(path) as jfile:
+        content = json.load(jfile)
+    return (content.get('inputs_hash') ==
+            _inputs_hash(state, reform_name, elasticities_name) and
+            set(state['variables']) <= set(content['baseline_totals']) and
+            (content['dump'] or not state['dump']))
+
+
+def _inputs_hash(state, reform_name, elasticities_name):
+    """
+    Return hexadecimal SHA-256 hash of the identity of the input data and
+    the contents of the baseline, the reform and the elasticities
+    dictionary of the cell.
+    """
+    inputs = [state['data'], state['baseline'], state['reforms'][reform_name],
+              state['elasticities'][elasticities_name]]
+    text = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _score_unit(unit, state):
+    """
+    Score the pending cells of the (reform_name, year, pending) unit and
+    write their cell files.
+    """
+    # pylint: disable=too-many-locals
+    reform_name, year, pending = unit
+    calc1 = _calculator(state, state['baseline'], year)
+    calc2 = _calculator(state, state['reforms'][reform_name], year)
+    weight = np.asarray(calc1.array('s006'))
+    variables = state['variables']
+    if state['dump']:
+        for name in pending:
+            handle = response_dump(
+                calc1, calc2, state['elasticities'][name],
+                _cell_path(state, reform_name, name, year, kind='dumps'),
+                lowcopy=True, incremental=True)
+            totals = [{var: float(np.dot(handle.array(side, var), weight))
+                       for var in variables}
+                      for side in ('baseline', 'reform')]
+            _write_cell(state, reform_name, name, year, totals)
+    else:
+        df1, df2_list = response_grid(
+            calc1, calc2, [state['elasticities'][name] for name in pending],
+            lowcopy=True, incremental=True)
+        baseline = {var: float(np.dot(df1[var], weight)) for var in variables}
+        for name, df2 in zip(pending, df2_list):
+            reform = {var: float(np.dot(df2[var], weight))
+                      for var in variables}
+            _write_cell(state, reform_name, name, year, (baseline, reform))
+    sys.stdout.write('scored reform {} in {}\n'.format(reform_name, year))
+    sys.stdout.flush()
+
+
+def _unit_worker(unit):
+    """
+    Score the pending cells of unit using the state of the cli_main function
+    inherited by a worker process.
+    """
+    _score_unit(unit, _WORKER_STATE)
+
+
+def _write_cell(state, reform_name, elasticities_name, year, totals):
+    """
+    Write the cell file containing the (baseline, reform) totals, first to
+    a temporary file that is then renamed, so that a crash never leaves a
+    partial cell file.
+    """
+    path = _cell_path(state, reform_name, elasticities_name, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    content = {'reform': reform_name,
+               'elasticities': elasticities_name,
+               'year': year,
+               'dump': state['dump'],
+               'inputs_hash': _inputs_hash(state, reform_name,
+                                           elasticities_name),
+               'baseline_totals': totals[0],
+               'reform_totals': totals[1]}
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as jfile:
+        json.dump(content, jfile, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def _write_aggregates(state, years):
+    """
+    Write the aggregates.csv file containing the results of all the cells.
+    """
+    rows = list()
+    for reform_name in state['reforms']:
+        for name in state['elasticities']:
+            for year in years:
+                with open(_cell_path(state, reform_name, name, year)) as jfile:
+                    content = json.load(jfile)
+                for var in state['variables']:
+                    rows.append({'reform': reform_name,
+                                 'elasticities': name,
+                                 'year': year,
+                                 'variable': var,
+                                 'baseline_total':
+                                 content['baseline_totals'][var],
+                                 'reform_total':
+                                 content['reform_totals'][var]})
+    dframe = pd.DataFrame(rows, columns=['reform', 'elasticities', 'year',
+                                         'variable', 'baseline_total',
+                                         'reform_total'])
+    dframe.to_csv(os.path.join(state['outdir'], 'aggregates.csv'),
+                  index=False)
@@ -0,0 +1,127 @@
+"""
+Columnar on-disk dump output of the Behavioral-Responses logic.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle dump.py
+# pylint --disable=locally-disabled dump.py
+
+import os
+import numpy as np
+import pandas as pd
+from behresp.behavior import (_pre_response, _add_responses,
+                              _dump_variables)
+from behresp.cache import TEMP_PREFIX, _store_array
+
+
+class DumpHandle():
+    """
+    Constructor for the DumpHandle class, which provides access to the
+    columnar dump output written by the response_dump function.
+
+    Parameters
+    ----------
+    path: string
+        name of directory containing a baseline and a reform subdirectory,
+        each of which contains one .npy file for each dump variable.
+
+    Returns
+    -------
+    class instance: DumpHandle
+    """
+
+    SIDES = ('baseline', 'reform')
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        for side in DumpHandle.SIDES:
+            assert os.path.isdir(os.path.join(self.path, side))
+
+    def variables(self, side='baseline'):
+        """
+        Return sorted list of the variable names in the side dump output.
+        """
+        assert side in DumpHandle.SIDES
+        return sorted(name[:-4]
+                      for name in os.listdir(os.path.join(self.path, side))
+                      if name.endswith('.npy') and
+                      not name.startswith(TEMP_PREFIX))
+
+    def array(self, side, variable):
+        """
+        Return read-only memory-mapped array containing the values of the
+        specified variable in the side dump output.
+        """
+        assert side in DumpHandle.SIDES
+        return np.load(os.path.join(self.path, side, variable + '.npy'),
+                       mmap_mode='r')
+
+    def dataframe(self, side, variables=None):
+        """
+        Return Pandas DataFrame containing the specified variables (or all
+        variables when variables is None) in the side dump output.
+        """
+        if variables is None:
+            variables = self.variables(side)
+        return pd.DataFrame({var: self.array(side, var)
+                             for var in variables})
+
+
+def response_dump(calc_1, calc_2, elasticities, path,
+                  lowcopy=False, incremental=False, n_jobs=1):
+    """
+    Implements the response function logic with dump=True, but rather than
+    returning two DataFrame objects, writes each dump variable to its own
+    .npy file in the baseline and reform subdirectories of the path
+    directory and returns a DumpHandle object for that directory.
+
+    The baseline variables are written as soon as the baseline results
+    have been calculated, and the baseline Calculator copy is released
+    before the behavioral responses are calculated, so no DataFrame
+    containing all the dump variables is ever held in memory.  The dump
+    variables are the same as in the response function dump output, but
+    each variable keeps its Tax-Calculator type (rather than all variables
+    being converted to floats by DataFrame construction).  Any .npy files
+    in the baseline and reform subdirectories (such as those of an earlier
+    dump to the same path) are removed before the new dump variables are
+    written, and each .npy file is first written to a temporary file that
+    is then renamed, so a crash never leaves a partial .npy file.
+
+    The lowcopy, incremental and n_jobs arguments have the same meaning as
+    in the response function.
+    """
+    # pylint: disable=too-many-arguments
+    be_values, calc1, calc2, res1, res2 = _pre_response(
+        calc_1, calc_2, elasticities, lowcopy, n_jobs)
+    dvars = [var for var in _dump_variables()
+             if var not in ('mtr_inctax', 'mtr_paytax')]
+    for side in DumpHandle.SIDES:
+        _remove_columns(os.path.join(path, side))
+    _write_columns(os.path.join(path, 'baseline'), calc1, dvars,
+                   res1['wage_mtr'])
+    del calc1
+    calc2 = _add_responses(calc2, res1, res2, be_values, incremental)
+    _write_columns(os.path.join(path, 'reform'), calc2, dvars,
+                   res2['wage_mtr'])
+    del calc2
+    return DumpHandle(path)
+
+
+def _write_columns(path, calc, dvars, wage_mtr):
+    """
+    Write each of the dvars variables in calc, plus mtr_combined computed
+    from wage_mtr, to its own .npy file in the path directory.
+    """
+    for var in dvars:
+        _store_array(path, var, calc.array(var))
+    _store_array(path, 'mtr_combined', wage_mtr * 100)
+
+
+def _remove_columns(path):
+    """
+    Remove all .npy files in the path directory (if it exists).
+    """
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if name.endswith('.npy'):
+            os.remove(os.path.join(path, name))
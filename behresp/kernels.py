@@ -0,0 +1,167 @@
+"""
+Fused numba ufunc kernels of the Behavioral-Responses primitive functions.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle kernels.py
+# pylint --disable=locally-disabled kernels.py
+
+import math
+import functools
+import numba
+import numpy as np
+
+
+# Each kernel is compiled for float64 and float32 arguments and results,
+# and, being a numpy ufunc, accepts the out and dtype keyword arguments and
+# broadcasts its arguments, computing each result element in a single pass
+# without allocating any intermediate array.  The float64 kernels do the
+# same floating-point operations in the same order as the pre-kernel numpy
+# expressions, so they produce bit-identical results.  But the compiler may
+# evaluate the divisions and comparisons guarded by the kernel branches for
+# elements whose results do not use them, so the kernels should be called
+# using the apply_kernel function, which ignores the floating-point divide
+# and invalid flags raised by those unused operations.  The ufunc of each
+# kernel is compiled (or loaded from the numba cache) when the kernel is
+# first called, so importing this module compiles nothing.
+PCH_SIGNATURES = ('float64(float64, float64, float64)',
+                  'float32(float32, float32, float32)')
+QUANTITY_SIGNATURES = (
+    'float64(float64, float64, float64, float64, float64, float64, float64)',
+    'float32(float32, float32, float32, float32, float32, float32, float32)'
+)
+SCENARIO_SIGNATURES = (
+    'float64(float64, float64, float64, float64, float64)',
+    'float32(float32, float32, float32, float32, float32)'
+)
+
+
+def _lazy_vectorize(signatures):
+    """
+    Return decorator that replaces a kernel function with a function that
+    calls the numba ufunc of the kernel function for the signatures, which
+    is built by the _ufunc function when the kernel is first called.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def kernel(*args, **kwargs):
+            return _ufunc(function, signatures)(*args, **kwargs)
+        return kernel
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def _ufunc(function, signatures):
+    """
+    Return numba ufunc of function for the signatures, which is built only
+    once in each process.
+    """
+    return numba.vectorize(list(signatures), nopython=True,
+                           cache=True)(function)
+
+
+@numba.njit(cache=True)
+def _pch(elasticity, val1, val2):
+    """
+    Return elasticity * (val2 / val1 - 1), or elasticity * 0 when val1 is
+    zero or not a number.
+    """
+    if math.isnan(val1) or val1 == 0:
+        return elasticity * 0.
+    return elasticity * (val2 / val1 - 1.)
+
+
+@numba.njit(cache=True)
+def _floor(value, minimum):
+    """
+    Return larger of value and minimum, or value when it is not a number,
+    which is the same as numpy.maximum(value, minimum).
+    """
+    if math.isnan(value) or value >= minimum:
+        return value
+    return minimum
+
+
+@_lazy_vectorize(PCH_SIGNATURES)
+def pch_kernel(elasticity, val1, val2):
+    """
+    Fused kernel of the pch_response function.
+    """
+    return _pch(elasticity, val1, val2)
+
+
+@_lazy_vectorize(QUANTITY_SIGNATURES)
+def quantity_kernel(quantity, price_elasticity,
+                    aftertax_price1, aftertax_price2,
+                    income_elasticity,
+                    aftertax_income1, aftertax_income2):
+    """
+    Fused kernel of the quantity_response function.
+    """
+    # pylint: disable=too-many-arguments
+    substitution_effect = _pch(price_elasticity,
+                               _floor(aftertax_price1, 0.01),
+                               _floor(aftertax_price2, 0.01))
+    income_effect = _pch(income_elasticity,
+                         _floor(aftertax_income1, 1.0),
+                         _floor(aftertax_income2, 1.0))
+    return quantity * (substitution_effect + income_effect)
+
+
+@_lazy_vectorize(QUANTITY_SIGNATURES)
+def labor_kernel(earnings, substitution_eti, mtr1, mtr2,
+                 income_elasticity, aftertax_income1, aftertax_income2):
+    """
+    Fused kernel of the labor_response function.
+    """
+    # pylint: disable=too-many-arguments
+    substitution_effect = _pch(substitution_eti,
+                               _floor(1. - mtr1, 0.01),
+                               _floor(1. - mtr2, 0.01))
+    income_effect = _pch(income_elasticity,
+                         _floor(aftertax_income1, 1.0),
+                         _floor(aftertax_income2, 1.0))
+    return earnings * (substitution_effect + income_effect)
+
+
+@_lazy_vectorize(PCH_SIGNATURES)
+def floor_pch_kernel(val1, val2, minimum):
+    """
+    Fused kernel of the proportional change from val1 to val2, both of
+    which are floored at minimum, which is the pch_response of the
+    quantity_response function with an elasticity of one.
+    """
+    return _pch(1., _floor(val1, minimum), _floor(val2, minimum))
+
+
+@_lazy_vectorize(PCH_SIGNATURES)
+def mtr_pch_kernel(mtr1, mtr2, minimum):
+    """
+    Fused kernel of the proportional change from 1 - mtr1 to 1 - mtr2, both
+    of which are floored at minimum, which is the substitution pch_response
+    of the labor_response function with an elasticity of one.
+    """
+    return _pch(1., _floor(1. - mtr1, minimum), _floor(1. - mtr2, minimum))
+
+
+@_lazy_vectorize(SCENARIO_SIGNATURES)
+def scenario_kernel(quantity, price_elasticity, price_pch,
+                    income_elasticity, income_pch):
+    """
+    Fused kernel of the quantity_response function given the proportional
+    changes in price and income computed by the floor_pch_kernel or
+    mtr_pch_kernel functions, which produces the same results as the
+    quantity_kernel and labor_kernel functions because multiplying by an
+    elasticity of one does not change a floating-point value.
+    """
+    return quantity * (price_elasticity * price_pch +
+                       income_elasticity * income_pch)
+
+
+def apply_kernel(kernel, args, out=None, dtype=None):
+    """
+    Return result of calling kernel with the args tuple of arguments and the
+    out and dtype keyword arguments, ignoring floating-point divide and
+    invalid flags.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return kernel(*args, out=out, dtype=dtype)
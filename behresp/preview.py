@@ -0,0 +1,296 @@
+"""
+Progressive subsample preview of the Behavioral-Responses aggregate results.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle preview.py
+# pylint --disable=locally-disabled preview.py
+
+import time
+import statistics
+import threading
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+from behresp.behavior import (response, _elasticity_values, _subset_calc,
+                              _subset_elasticities, _decile_index)
+
+
+# input income variables whose sum is used to stratify the filing units
+STRATA_INCOME_VARS = ('e00200', 'e00300', 'e00600', 'e00900', 'e01500',
+                      'e01700', 'e02000', 'e02400', 'p22250', 'p23250')
+
+
+class ResponsePreview():
+    """
+    Constructor for the ResponsePreview class, which is the handle returned
+    by the response_preview function that provides access to the estimates
+    computed on successively larger subsamples.
+
+    Returns
+    -------
+    class instance: ResponsePreview
+
+    Notes
+    -----
+    Each estimate is a dictionary containing these keys:
+     'fraction': the sampling fraction of the subsample,
+     'filing_units': the number of filing units in the subsample,
+     'baseline', 'reform' and 'change': dictionaries containing for each
+       variable the estimated weighted total in the baseline, in the reform
+       (incorporating the behavioral responses) and their difference,
+     'std_error' and 'half_width': dictionaries containing for each
+       variable the sampling standard error of the estimated change and the
+       half width of its confidence interval (both of which are zero for
+       the full sample), and
+     'seconds': the number of seconds used to compute the estimate.
+    """
+
+    def __init__(self):
+        self.estimates = list()
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._cancelled = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def latest(self):
+        """
+        Return the most recent (and most precise) estimate.
+        """
+        with self._lock:
+            return self.estimates[-1]
+
+    def done(self):
+        """
+        Return True if refinement has finished (because the full sample or
+        the tolerance was reached, the preview was cancelled, or an error
+        was raised), and False otherwise.
+        """
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait at most timeout seconds (or until refinement has finished when
+        timeout is None) and return the most recent estimate, after raising
+        any error raised by the refinement.
+        """
+        self._finished.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self.latest()
+
+    def cancel(self):
+        """
+        Stop refinement after the estimate that is being computed.
+        """
+        self._cancelled.set()
+
+    def _add(self, estimate, callback):
+        """
+        Add estimate to the estimates and pass it to callback (if any).
+        """
+        with self._lock:
+            self.estimates.append(estimate)
+        if callback is not None:
+            callback(estimate)
+
+    def _refine(self, plan, fractions, callback):
+        """
+        Add the estimate for each of the fractions until the tolerance in
+        plan is reached or the preview is cancelled.
+        """
+        try:
+            for fraction in fractions:
+                if self._cancelled.is_set():
+                    break
+                estimate = _estimate(plan, fraction)
+                self._add(estimate, callback)
+                if _precise(estimate, plan['tolerance']):
+                    break
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+        finally:
+            self._finished.set()
+
+
+def response_preview(calc_1, calc_2, elasticities,
+                     variables=('iitax', 'payrolltax', 'combined'),
+                     fractions=(0.01, 0.03, 0.1, 0.3, 1.0), tolerance=None,
+                     confidence=0.90, seed=180, callback=None):
+    """
+    Implements the response function logic on a stratified subsample of
+    the filing units, returning a ResponsePreview object whose first
+    estimate of the weighted totals of the specified variables (and of
+    their sampling error) is available as soon as this function returns,
+    while larger subsamples are calculated in a background thread until
+    the error is small enough or the full sample has been calculated.
+
+    The filing units are stratified by MARS and by decile of the sum of
+    their STRATA_INCOME_VARS (ranked using s006 weights), and the fractions
+    (which must increase and should end with 1.0, which is the full sample)
+    specify the share of each stratum in each subsample.  Each subsample
+    contains every filing unit of the smaller subsamples (the filing units
+    of each stratum are drawn in a random order determined by the seed
+    argument), and its s006 weights are multiplied by the inverse of the
+    share of the stratum in the subsample, so that the weights of each
+    stratum have the same total as in the full sample.  The response
+    function is called for each subsample with lowcopy=True and
+    incremental=True.
+
+    The sampling error of the change in the total of each variable is
+    estimated by the usual stratified-sampling formula (including the
+    finite-population correction, so there is no error for the full
+    sample).  When tolerance is not None, refinement stops as soon as the
+    half width of the confidence interval (with the specified confidence
+    level) of the change in every variable's total is no greater than the
+    tolerance dollars.  When callback is not None, each estimate is passed
+    to callback as soon as it is computed (the first one in the calling
+    thread and the others in the background thread).
+
+    Neither calc_1 nor calc_2 are affected by this function, but they must
+    not be changed before refinement has finished.  Tax-Calculator holds
+    the global interpreter lock during most of its calculations, so the
+    background thread slows down the other threads of the process, which
+    can call the cancel method of the ResponsePreview object to stop it.
+    Note that the first response calculation in a process also compiles
+    the Tax-Calculator functions, which takes much longer than calculating
+    a small subsample.
+    """
+    # pylint: disable=too-many-arguments
+    assert isinstance(calc_1, tc.Calculator)
+    assert isinstance(calc_2, tc.Calculator)
+    assert calc_1.array_len == calc_2.array_len
+    assert isinstance(variables, (list, tuple)) and variables
+    fractions = list(fractions)
+    assert fractions
+    assert all(0.0 < fraction <= 1.0 for fraction in fractions)
+    assert all(small < large
+               for small, large in zip(fractions[:-1], fractions[1:]))
+    assert tolerance is None or tolerance >= 0.0
+    assert 0.0 < confidence < 1.0
+    plan = {'calc_1': calc_1, 'calc_2': calc_2,
+            'be_values': _elasticity_values(elasticities, calc_1),
+            'variables': list(variables),
+            'tolerance': tolerance,
+            'zscore': statistics.NormalDist().inv_cdf(0.5 + 0.5 * confidence)}
+    _stratify(plan, seed)
+    preview = ResponsePreview()
+    # pylint: disable=protected-access
+    preview._add(_estimate(plan, fractions[0]), callback)
+    if _precise(preview.latest(), tolerance) or len(fractions) == 1:
+        preview._finished.set()
+    else:
+        preview._thread = threading.Thread(
+            target=preview._refine, args=(plan, fractions[1:], callback),
+            name='behresp-preview', daemon=True)
+        preview._thread.start()
+    return preview
+
+
+def _stratify(plan, seed):
+    """
+    Add to plan the stratum of each filing unit, the number of filing units
+    in each stratum, and the rank of each filing unit in the random order
+    in which the filing units of its stratum are drawn.
+    """
+    calc = plan['calc_1']
+    income = np.zeros(calc.array_len)
+    for var in STRATA_INCOME_VARS:
+        income += calc.array(var)
+    decile = _decile_index(income, np.asarray(calc.array('s006')))
+    _, stratum = np.unique(calc.array('MARS') * 10 + decile,
+                           return_inverse=True)
+    stratum = stratum.ravel()
+    priority = np.random.default_rng(seed).random(calc.array_len)
+    order = np.lexsort((priority, stratum))
+    counts = np.bincount(stratum)
+    starts = np.cumsum(counts) - counts
+    rank = np.empty(calc.array_len, dtype=np.int64)
+    rank[order] = np.arange(calc.array_len) - starts[stratum[order]]
+    plan['stratum'] = stratum
+    plan['counts'] = counts
+    plan['rank'] = rank
+
+
+def _estimate(plan, fraction):
+    """
+    Return estimate dictionary (see the ResponsePreview documentation) for
+    the subsample containing the specified fraction of each stratum.
+    """
+    # pylint: disable=too-many-locals
+    start_time = time.time()
+    counts = plan['counts']
+    sizes = np.minimum(counts, np.maximum(2, np.ceil(fraction * counts)))
+    index = np.flatnonzero(plan['rank'] < sizes[plan['stratum']])
+    be_values = plan['be_values']
+    factor = (counts / sizes)[plan['stratum'][index]]
+    if index.size == plan['calc_1'].array_len:
+        calc1 = plan['calc_1']
+        calc2 = plan['calc_2']
+        elasticities = _subset_elasticities(be_values, slice(None))
+    else:
+        calcs = list()
+        for calc in (plan['calc_1'], plan['calc_2']):
+            subset = _subset_calc(calc, index)
+            # pylint: disable=protected-access
+            records = subset._Calculator__records
+            records.s006 = pd.Series(np.asarray(records.s006) * factor,
+                                     index=records.s006.index,
+                                     name=records.s006.name)
+            calcs.append(subset)
+        calc1 = calcs[0]
+        calc2 = calcs[1]
+        elasticities = _subset_elasticities(be_values, index)
+    df1, df2 = response(calc1, calc2, elasticities, lowcopy=True,
+                        incremental=True)
+    del calc1
+    del calc2
+    weight = np.asarray(df1['s006'])
+    stratum = plan['stratum'][index]
+    estimate = {'fraction': fraction,
+                'filing_units': int(index.size),
+                'baseline': dict(), 'reform': dict(), 'change': dict(),
+                'std_error': dict(), 'half_width': dict()}
+    for var in plan['variables']:
+        value1 = np.asarray(df1[var], dtype=np.float64)
+        value2 = np.asarray(df2[var], dtype=np.float64)
+        estimate['baseline'][var] = float(np.dot(value1, weight))
+        estimate['reform'][var] = float(np.dot(value2, weight))
+        estimate['change'][var] = (estimate['reform'][var] -
+                                   estimate['baseline'][var])
+        # weighted changes using the full-sample weights
+        std_error = _std_error((value2 - value1) * (weight / factor),
+                               stratum, counts, sizes)
+        estimate['std_error'][var] = std_error
+        estimate['half_width'][var] = plan['zscore'] * std_error
+    estimate['seconds'] = time.time() - start_time
+    return estimate
+
+
+def _std_error(values, stratum, counts, sizes):
+    """
+    Return the stratified-sampling standard error of the estimated total
+    of the values of the sampled filing units in each stratum, given the
+    number of filing units in each stratum and in its sample.
+    """
+    sum1 = np.bincount(stratum, weights=values, minlength=counts.size)
+    sum2 = np.bincount(stratum, weights=values * values,
+                       minlength=counts.size)
+    sampled = sizes > 1
+    variance = np.zeros(counts.size)
+    variance[sampled] = np.maximum(
+        sum2[sampled] - sum1[sampled] ** 2 / sizes[sampled], 0.
+    ) / (sizes[sampled] - 1)
+    return float(np.sqrt(np.sum(counts ** 2 * (1. - sizes / counts) *
+                                variance / sizes)))
+
+
+def _precise(estimate, tolerance):
+    """
+    Return True if tolerance is not None and the half width of the
+    confidence interval of every variable's change is within tolerance.
+    """
+    if tolerance is None:
+        return False
+    return all(half_width <= tolerance
+               for half_width in estimate['half_width'].values())
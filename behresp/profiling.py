@@ -0,0 +1,119 @@
+"""
+Phase-level timing and memory instrumentation of Behavioral-Responses logic.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle profiling.py
+# pylint --disable=locally-disabled profiling.py
+
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+
+
+class ResponseProfile():
+    """
+    Constructor for the ResponseProfile class, which records the wall time,
+    CPU time and peak allocated memory of each named phase of a response
+    function call when passed as the response function's profile argument.
+
+    Parameters
+    ----------
+    logger: logging.Logger or None
+        logger to which a message is logged (at the INFO level) as soon as
+        each phase ends.  Default value of None implies no logging.
+
+    callback: function or None
+        function called with the phase statistics dictionary as its only
+        argument as soon as each phase ends.  Default value of None implies
+        no callback.
+
+    trace_memory: boolean
+        whether or not the peak allocated memory of each phase is measured
+        using the tracemalloc module (which is started if it is not already
+        tracing and stopped when the phase ends), which slows down the
+        measured phases.  When False, the peak_memory statistic is None.
+        The peak_memory statistic is also None when tracemalloc is already
+        tracing on Python 3.8, which cannot reset the traced peak at the
+        start of each phase (tracemalloc.reset_peak is new in Python 3.9),
+        so that the traced peak may have occurred before the phase.
+
+    Returns
+    -------
+    class instance: ResponseProfile
+
+    Notes
+    -----
+    The statistics for each phase are stored in the phases list as a
+    dictionary containing the phase name, its wall_time and cpu_time in
+    seconds, and its peak_memory, which is the peak traced memory during
+    the phase minus the traced memory at the start of the phase in bytes.
+    """
+
+    def __init__(self, logger=None, callback=None, trace_memory=True):
+        assert logger is None or isinstance(logger, logging.Logger)
+        assert callback is None or callable(callback)
+        self.logger = logger
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.phases = list()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager that records the statistics of the named phase.
+        """
+        started_tracing = False
+        trace_memory = self.trace_memory
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                tracemalloc.reset_peak()
+            else:
+                trace_memory = False
+        if trace_memory:
+            start_memory, _ = tracemalloc.get_traced_memory()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stats = {'phase': name,
+                     'wall_time': time.perf_counter() - start_wall,
+                     'cpu_time': time.process_time() - start_cpu,
+                     'peak_memory': None}
+            if trace_memory:
+                _, peak_memory = tracemalloc.get_traced_memory()
+                stats['peak_memory'] = max(peak_memory - start_memory, 0)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append(stats)
+            if self.logger is not None:
+                self.logger.info(
+                    'behresp phase %s: wall_time=%.3fs cpu_time=%.3fs '
+                    'peak_memory=%s', name, stats['wall_time'],
+                    stats['cpu_time'], stats['peak_memory'])
+            if self.callback is not None:
+                self.callback(stats)
+
+    def totals(self):
+        """
+        Return dictionary containing the total wall_time and cpu_time of
+        all the recorded phases and the largest peak_memory of any phase.
+        """
+        peaks = [stats['peak_memory'] for stats in self.phases
+                 if stats['peak_memory'] is not None]
+        return {'wall_time': sum(stats['wall_time']
+                                 for stats in self.phases),
+                'cpu_time': sum(stats['cpu_time'] for stats in self.phases),
+                'peak_memory': max(peaks) if peaks else None}
+
+    def to_json(self):
+        """
+        Return JSON string containing the recorded phase statistics.
+        """
+        return json.dumps({'phases': self.phases, 'totals': self.totals()},
+                          indent=2)
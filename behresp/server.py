@@ -0,0 +1,510 @@
+"""
+Long-lived local scoring service with a warm baseline.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle server.py
+# pylint --disable=locally-disabled server.py
+
+import copy
+import json
+import time
+import queue
+import threading
+import collections
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import taxcalc as tc
+from behresp.behavior import (_elasticity_values, _mtrs_needed, _copy_calc,
+                              _calc_all_and_mtrs, _add_responses,
+                              _reform_response, _add_aggregates,
+                              _decile_index, _dataframe, _dump_variables,
+                              _process_pool, _WORKER_STATE)
+
+
+class ResponseServer():
+    """
+    Constructor for the ResponseServer class, which keeps the baseline
+    results (the calc_all() results and the marginal tax rates) of a
+    baseline-policy Calculator object warm in memory and computes the
+    behavioral-response results of reform requests, which are submitted
+    directly (using the submit method) or as JSON over a local HTTP
+    endpoint, queued and processed in batches.
+
+    Parameters
+    ----------
+    calc_1: Tax-Calculator Calculator object
+        baseline-policy Calculator object, which is not affected by the
+        server.
+
+    host: string
+        address on which the HTTP endpoint listens, which is the local
+        loopback address by default.
+
+    port: integer or None
+        port on which the HTTP endpoint listens, where zero (its default
+        value) implies an unused port chosen by the operating system (see
+        the address attribute) and None implies no HTTP endpoint.
+
+    n_jobs: integer
+        maximum number of worker processes that process request batches.
+        When n_jobs=1 (its default value), requests are processed by a
+        thread of the current process.  Worker processes are created by
+        forking the current process when the server is started, so they
+        inherit the warm baseline, and n_jobs > 1 is not supported on
+        Windows.
+
+    max_batch: integer
+        maximum number of queued requests dequeued as one batch, which is
+        split among the worker processes.
+
+    batch_wait: float
+        maximum number of seconds to wait for more requests after the
+        first request of a batch is dequeued.
+
+    Returns
+    -------
+    class instance: ResponseServer
+
+    Notes
+    -----
+    Each request is a dictionary (a JSON object when sent to the HTTP
+    endpoint) with these keys, all but the first two of which are optional:
+
+     'reform': Tax-Calculator reform dictionary, which is implemented on
+       current-law policy to construct the reform-policy Calculator object
+       (using the calc_1 records and current year).
+
+     'elasticities': response function elasticities dictionary.
+
+     'result': 'aggregates' (the default) or 'dataframe'.  Aggregates are
+       the response_aggregates results for the 'variables' list (whose
+       default value is the response_aggregates default) and, when
+       'deciles' is true, the decile totals.  DataFrame results are the
+       (df1, df2) tuple returned by the response function, which contains
+       all variables when 'dump' is true.
+
+    The results are the same as those of the response and
+    response_aggregates functions (with incremental=True, which produces
+    the same results as the default incremental=False).  Each server
+    process keeps the current-law Policy object and the Policy objects of
+    the most recently used reforms, so only the reform calc_all() and
+    marginal tax rate calculations are done for a repeated reform.
+
+    The HTTP endpoint accepts POST requests to /response, whose body is the
+    JSON request and whose response body is the JSON results (with each
+    DataFrame in split orientation and each array as a list) or a JSON
+    object containing an 'error' message, and GET requests to /metrics,
+    whose response body is the JSON metrics (see the metrics method).
+    It has no authentication, so it should listen only on a local address.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    REFORM_POLICIES = 16  # number of reform Policy objects kept warm
+    LATENCIES = 1000  # number of latencies used in the metrics
+
+    def __init__(self, calc_1, host='127.0.0.1', port=0, n_jobs=1,
+                 max_batch=8, batch_wait=0.005):
+        # pylint: disable=too-many-arguments
+        assert isinstance(calc_1, tc.Calculator)
+        assert port is None or isinstance(port, int)
+        assert isinstance(n_jobs, int) and n_jobs >= 1
+        assert isinstance(max_batch, int) and max_batch >= 1
+        assert batch_wait >= 0.0
+        self.calc_1 = calc_1
+        self.host = host
+        self.port = port
+        self.n_jobs = n_jobs
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.address = None
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(n_jobs)
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._latencies = collections.deque(maxlen=ResponseServer.LATENCIES)
+        self._waits = collections.deque(maxlen=ResponseServer.LATENCIES)
+        self._state = None
+        self._pool = None
+        self._threads = list()
+        self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Compute the warm baseline, start the worker processes (if any),
+        the batching thread and the HTTP endpoint (if any), and return
+        this server object.
+        """
+        assert not self._threads, 'server has already been started'
+        self._state = _warm_state(self.calc_1)
+        if self.n_jobs > 1:
+            self._pool = _process_pool(self.n_jobs, self._state)
+            # fork all the worker processes before starting any thread
+            self._pool.submit(len, ()).result()
+        self._threads.append(threading.Thread(target=self._dispatch,
+                                              name='behresp-dispatch',
+                                              daemon=True))
+        if self.port is not None:
+            self._httpd = ThreadingHTTPServer((self.host, self.port),
+                                              _RequestHandler)
+            self._httpd.daemon_threads = True
+            self._httpd.response_server = self
+            self.address = self._httpd.server_address[:2]
+            self._threads.append(threading.Thread(
+                target=self._httpd.serve_forever, name='behresp-http',
+                daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the HTTP endpoint, finish processing the queued requests, and
+        stop the batching thread and the worker processes.
+        """
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._threads:
+            self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+            self._threads = list()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._state = None
+
+    def submit(self, request):
+        """
+        Queue request dictionary (see the class documentation) and return
+        a concurrent.futures.Future object whose result is the request's
+        results, or whose exception is raised by an invalid request.
+        """
+        assert self._threads, 'server has not been started'
+        future = Future()
+        try:
+            _request_options(request)
+        except (AssertionError, KeyError, TypeError, ValueError) as err:
+            future.set_exception(err)
+            self._record(0., 0., error=True)
+            return future
+        self._queue.put((request, future, time.perf_counter()))
+        return future
+
+    def metrics(self):
+        """
+        Return dictionary containing the number of queued requests
+        ('queue_depth'), of request batches being processed ('in_flight'),
+        of completed and failed requests and of processed batches, and the
+        mean, median, 95th percentile and maximum of the latency (from
+        submission to completion) and queue wait (from submission to
+        processing) in seconds of the most recent requests.
+        """
+        with self._lock:
+            metrics = {'queue_depth': self._queue.qsize(),
+                       'in_flight': self._counts['in_flight'],
+                       'requests': self._counts['requests'],
+                       'errors': self._counts['errors'],
+                       'batches': self._counts['batches'],
+                       'latency': _summary(self._latencies),
+                       'queue_wait': _summary(self._waits)}
+        return metrics
+
+    def _dispatch(self):
+        """
+        Dequeue requests in batches and process each batch, stopping when
+        the None sentinel is dequeued.
+        """
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0., deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            # split the batch among the worker processes
+            parts = min(self.n_jobs, len(batch))
+            for part in range(parts):
+                self._process(batch[part::parts])
+        # wait for all batches being processed by the worker processes
+        for _ in range(self.n_jobs):
+            self._slots.acquire()  # pylint: disable=consider-using-with
+        for _ in range(self.n_jobs):
+            self._slots.release()
+
+    def _process(self, batch):
+        """
+        Process batch of (request, future, submitted) items in this thread or,
+        when there are worker processes, in the first available one.
+        """
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        with self._lock:
+            self._counts['in_flight'] += 1
+            self._counts['batches'] += 1
+        started = time.perf_counter()
+        requests = [request for request, _, _ in batch]
+        if self._pool is None:
+            self._finish(batch, started, _serve_batch(requests, self._state))
+        else:
+            self._pool.submit(_batch_worker, requests).add_done_callback(
+                lambda done: self._finish(batch, started,
+                                          _outcomes(done, batch)))
+
+    def _finish(self, batch, started, outcomes):
+        """
+        Set the result or exception of each request future in batch given
+        the list of (ok, value) outcomes of processing the batch that was
+        started at the started time.
+        """
+        with self._lock:
+            self._counts['in_flight'] -= 1
+        self._slots.release()
+        for (_, future, submitted), (ok, value) in zip(batch, outcomes):
+            self._record(time.perf_counter() - submitted, started - submitted,
+                         error=not ok)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _record(self, latency, wait, error):
+        """
+        Record the latency and queue wait of a completed request.
+        """
+        with self._lock:
+            self._counts['requests'] += 1
+            if error:
+                self._counts['errors'] += 1
+            self._latencies.append(latency)
+            self._waits.append(wait)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the HTTP requests sent to a ResponseServer endpoint.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Send the server metrics.
+        """
+        if self.path != '/metrics':
+            self._send(404, {'error': 'unknown path {}'.format(self.path)})
+            return
+        self._send(200, self.server.response_server.metrics())
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Send the results of the JSON request.
+        """
+        if self.path != '/response':
+            self._send(404, {'error': 'unknown path {}'.format(self.path)})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            future = self.server.response_server.submit(request)
+            results = future.result()
+        except (AssertionError, KeyError, TypeError, ValueError) as err:
+            self._send(400, {'error': repr(err)})
+            return
+        except Exception as err:  # pylint: disable=broad-except
+            self._send(500, {'error': repr(err)})
+            return
+        self._send(200, _jsonable(results))
+
+    def log_message(self, format, *args):
+        # pylint: disable=redefined-builtin
+        pass
+
+    def _send(self, status, content):
+        """
+        Send the JSON content with the status code.
+        """
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _warm_state(calc_1):
+    """
+    Return dictionary containing the warm baseline state computed from
+    calc_1, which contains the marginal tax rates for every elasticity.
+    """
+    calc1 = _copy_calc(calc_1, lowcopy=True)
+    res1 = _calc_all_and_mtrs(calc1, wage_mtr=True, ltcg_mtr=True)
+    weight = np.asarray(calc1.array('s006'))
+    current_law = tc.Policy()
+    return {'calc1': calc1,
+            'res1': res1,
+            'weight': weight,
+            'decile': _decile_index(calc1.array('expanded_income'), weight),
+            'dvars': _dump_variables(),
+            'current_law': current_law,
+            'policies': collections.OrderedDict()}
+
+
+def _request_options(request):
+    """
+    Return dictionary of the request options after checking them and
+    converting the reform years to integers.
+    """
+    assert isinstance(request, dict)
+    unknown = set(request) - set(('reform', 'elasticities', 'result', 'dump',
+                                  'variables', 'deciles'))
+    assert not unknown, 'unknown request keys {}'.format(sorted(unknown))
+    assert isinstance(request['reform'], dict)
+    _elasticity_values(request['elasticities'])
+    options = {'reform': {param: {int(year): value
+                                  for year, value in values.items()}
+                          for param, values in request['reform'].items()},
+               'elasticities': request['elasticities'],
+               'result': request.get('result', 'aggregates'),
+               'dump': bool(request.get('dump', False)),
+               'variables': list(request.get('variables',
+                                             ('iitax', 'payrolltax',
+                                              'combined', 'c04800'))),
+               'deciles': bool(request.get('deciles', False))}
+    assert options['result'] in ('aggregates', 'dataframe')
+    return options
+
+
+def _reform_policy(reform, state):
+    """
+    Return Policy object that implements reform on current-law policy,
+    which is kept warm in state for the most recently used reforms.
+    """
+    key = json.dumps(reform, sort_keys=True)
+    policies = state['policies']
+    if key in policies:
+        policies.move_to_end(key)
+        return policies[key]
+    policy = copy.deepcopy(state['current_law'])
+    try:
+        policy.implement_reform(reform)
+    except Exception as err:
+        # paramtools validation errors cannot be pickled
+        raise ValueError('invalid reform: {}'.format(err)) from None
+    policy.set_year(state['calc1'].current_year)
+    policies[key] = policy
+    if len(policies) > ResponseServer.REFORM_POLICIES:
+        policies.popitem(last=False)
+    return policy
+
+
+def _serve(request, state):
+    """
+    Return results of request using the warm state.
+    """
+    # pylint: disable=too-many-locals
+    options = _request_options(request)
+    calc1 = state['calc1']
+    be_values = _elasticity_values(options['elasticities'], calc1)
+    wage_mtr, ltcg_mtr = _mtrs_needed(be_values)
+    # use the same baseline results as the response function
+    res1 = dict(state['res1'])
+    if not wage_mtr:
+        res1['wage_mtr'] = np.zeros(calc1.array_len)
+    if not ltcg_mtr:
+        res1['ltcg_mtr'] = np.zeros(calc1.array_len)
+    calc2 = _copy_calc(calc1, lowcopy=True)
+    # pylint: disable=protected-access
+    calc2._Calculator__policy = _reform_policy(options['reform'], state)
+    res2 = _calc_all_and_mtrs(calc2, wage_mtr, ltcg_mtr)
+    if options['result'] == 'aggregates':
+        decile = state['decile'] if options['deciles'] else None
+        results = dict()
+        _add_aggregates(results, 'baseline', calc1, options['variables'],
+                        state['weight'], decile)
+        calc2 = _add_responses(calc2, res1, res2, be_values, incremental=True)
+        _add_aggregates(results, 'reform', calc2, options['variables'],
+                        state['weight'], decile)
+        return results
+    dvars = state['dvars'] if options['dump'] else None
+    df1 = _dataframe(calc1, dvars, res1['wage_mtr'])
+    df2 = _reform_response(calc2, res1, res2, be_values, dvars,
+                           incremental=True)
+    return (df1, df2)
+
+
+def _serve_batch(requests, state):
+    """
+    Return list of (ok, value) outcomes of the requests using the warm
+    state, where value is the results when ok is True and the raised
+    exception otherwise.
+    """
+    outcomes = list()
+    for request in requests:
+        try:
+            outcomes.append((True, _serve(request, state)))
+        except Exception as err:  # pylint: disable=broad-except
+            outcomes.append((False, err))
+    return outcomes
+
+
+def _batch_worker(requests):
+    """
+    Return list of outcomes of the requests using the warm state inherited
+    by a worker process.
+    """
+    return _serve_batch(requests, _WORKER_STATE)
+
+
+def _outcomes(done, batch):
+    """
+    Return list of outcomes of the batch whose processing by a worker
+    process is done, all of which are failures when the worker process
+    could not return the outcomes.
+    """
+    error = done.exception()
+    if error is not None:
+        return [(False, error)] * len(batch)
+    return done.result()
+
+
+def _summary(values):
+    """
+    Return dictionary containing the mean, median, 95th percentile and
+    maximum of values, which are None when there are no values.
+    """
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None, 'max': None}
+    array = np.array(values)
+    return {'mean': float(array.mean()),
+            'p50': float(np.percentile(array, 50)),
+            'p95': float(np.percentile(array, 95)),
+            'max': float(array.max())}
+
+
+def _jsonable(results):
+    """
+    Return JSON-serializable version of request results.
+    """
+    if isinstance(results, tuple):
+        return {'baseline': json.loads(results[0].to_json(orient='split')),
+                'reform': json.loads(results[1].to_json(orient='split'))}
+    return {name: {var: (value.tolist() if isinstance(value, np.ndarray)
+                         else value)
+                   for var, value in values.items()}
+            for name, values in results.items()}
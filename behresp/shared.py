@@ -0,0 +1,347 @@
+"""
+Shared-memory transport of Calculator records to worker processes and a
+pool of worker processes that uses it.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle shared.py
+# pylint --disable=locally-disabled shared.py
+
+import sys
+import copy
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+from behresp.behavior import response
+
+
+class SharedCalculator():
+    # pylint: disable=too-many-instance-attributes
+    """
+    Constructor for the SharedCalculator class, which places the records
+    arrays of a Calculator object in one shared-memory block, so that any
+    process (including worker processes started by the spawn or forkserver
+    methods) can reconstruct an equivalent Calculator object whose records
+    arrays are zero-copy read-only views of the shared-memory arrays.
+
+    Parameters
+    ----------
+    calc: Tax-Calculator Calculator object
+        Calculator object whose records, policy parameter values and
+        consumption parameter values for its current year are shared.
+
+    Returns
+    -------
+    class instance: SharedCalculator
+
+    Notes
+    -----
+    A SharedCalculator object is small when pickled (it contains the name
+    and layout of the shared-memory block and the current-year policy and
+    consumption parameter values, but none of the records arrays), so it
+    can be passed to worker processes as a task argument, and each worker
+    process reconstructs the Calculator object only once (see the
+    calculator method) until it is released (see the release method).  The
+    process that constructs the SharedCalculator object owns the
+    shared-memory block, which is released by the close method (or at the
+    end of a with statement).
+
+    The reconstructed Calculator object has the same current year as calc
+    and cannot be advanced to another year, and its records arrays cannot
+    be changed in place.  So, it can be passed to the response functions
+    (which never change their Calculator arguments), and it is best passed
+    with lowcopy=True, in which case only the records arrays changed by the
+    response logic are copied.
+    """
+
+    def __init__(self, calc):
+        assert isinstance(calc, tc.Calculator)
+        # pylint: disable=protected-access
+        records = calc._Calculator__records
+        policy = calc._Calculator__policy
+        consumption = calc._Calculator__consumption
+        arrays = dict()
+        self.series_names = dict()
+        for var, value in vars(records).items():
+            if isinstance(value, pd.Series):
+                self.series_names[var] = value.name
+                arrays[var] = value.values
+            elif isinstance(value, np.ndarray):
+                arrays[var] = value
+        self.nbytes = sum(_aligned(value.nbytes) for value in arrays.values())
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=max(self.nbytes, 1))
+        self.name = self._shm.name
+        self.layout = dict()
+        offset = 0
+        for var, value in arrays.items():
+            view = np.ndarray(value.shape, dtype=value.dtype,
+                              buffer=self._shm.buf, offset=offset)
+            view[...] = value
+            del view
+            self.layout[var] = (offset, value.dtype.str, value.shape)
+            offset += _aligned(value.nbytes)
+        self.records = copy.copy(records)
+        for var in arrays:
+            delattr(self.records, var)
+        # annual growth factors and weights are needed only to advance
+        self.records.gfactors = None
+        self.records.WT = None
+        self.records.ADJ = None
+        self.current_year = calc.current_year
+        self.policy_values = {param: getattr(policy, param)
+                              for param in policy.keys()}
+        self.consumption_values = {param: getattr(consumption, param)
+                                   for param in consumption.keys()}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def calculator(self):
+        """
+        Return Calculator object whose records arrays are read-only views
+        of the shared-memory arrays, which is constructed only once in each
+        process.
+        """
+        if self.name not in _CALCULATORS:
+            _CALCULATORS[self.name] = self._reconstruct()
+        return _CALCULATORS[self.name][1]
+
+    def release(self):
+        """
+        Release the Calculator object reconstructed in this process (if any)
+        and, in a process other than the one that constructed this object,
+        close (but do not unlink) the attached shared-memory block.
+        """
+        entry = _CALCULATORS.pop(self.name, None)
+        if entry is None:
+            return
+        shm = entry[0]
+        del entry  # the Calculator object views the shared-memory block
+        if shm is not self._shm:
+            try:
+                shm.close()
+            except BufferError:
+                # an array viewing the block is still alive, so the block
+                # is closed when the process exits
+                pass
+
+    def close(self):
+        """
+        Release the shared-memory block, which must be done in the process
+        that constructed this object after the worker processes are done.
+        """
+        _CALCULATORS.pop(self.name, None)
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _reconstruct(self):
+        """
+        Return (shm, calc) tuple containing the attached shared-memory block
+        and the Calculator object whose records arrays are views of it.
+        """
+        shm = self._shm
+        if shm is None:
+            shm = _attach(self.name)
+        records = copy.copy(self.records)
+        for var, (offset, dtype, shape) in self.layout.items():
+            view = np.ndarray(shape, dtype=np.dtype(dtype),
+                              buffer=shm.buf, offset=offset)
+            view.flags.writeable = False
+            if var in self.series_names:
+                # pylint: disable=protected-access
+                view = pd.Series(view, index=records._Data__index,
+                                 name=self.series_names[var], copy=False)
+            setattr(records, var, view)
+        policy = copy.deepcopy(_template(tc.Policy, self.current_year))
+        for param, value in self.policy_values.items():
+            setattr(policy, param, value)
+        consumption = copy.deepcopy(_template(tc.Consumption,
+                                              self.current_year))
+        for param, value in self.consumption_values.items():
+            setattr(consumption, param, value)
+        calc = tc.Calculator.__new__(tc.Calculator)
+        # pylint: disable=protected-access
+        calc._Calculator__policy = policy
+        calc._Calculator__records = records
+        calc._Calculator__consumption = consumption
+        calc._Calculator__stored_records = None
+        assert calc.current_year == self.current_year
+        return (shm, calc)
+
+
+def shared_response(shared_1, shared_2, elasticities, dump=False,
+                    incremental=False):
+    """
+    Return the response function results for the Calculator objects
+    reconstructed from the shared_1 and shared_2 SharedCalculator objects
+    (with lowcopy=True), which is meant to be submitted as a task to a pool
+    of worker processes, each of which reconstructs the Calculator objects
+    only once.
+
+    The elasticities, dump and incremental arguments have the same meaning
+    as in the response function.  The reconstructed shared_2 Calculator
+    object is released (see the SharedCalculator release method) after the
+    response results have been computed, because shared_2 is usually used
+    for only one task.
+    """
+    assert isinstance(shared_1, SharedCalculator)
+    assert isinstance(shared_2, SharedCalculator)
+    try:
+        return response(shared_1.calculator(), shared_2.calculator(),
+                        elasticities, dump=dump, lowcopy=True,
+                        incremental=incremental)
+    finally:
+        shared_2.release()
+
+
+class SharedResponsePool():
+    """
+    Constructor for the SharedResponsePool class, which is a pool of worker
+    processes that compute the response function results for reform-policy
+    Calculator objects that are all compared with the same baseline-policy
+    Calculator object, whose records are passed to the worker processes
+    using SharedCalculator objects.
+
+    Parameters
+    ----------
+    calc_1: Tax-Calculator Calculator object
+        baseline-policy Calculator object, which is shared once for all
+        tasks.
+
+    n_jobs: integer
+        maximum number of worker processes.
+
+    mp_context: multiprocessing context or None
+        context used to start the worker processes, where None (its default
+        value) implies the default start method of the platform.
+
+    Returns
+    -------
+    class instance: SharedResponsePool
+
+    Notes
+    -----
+    Each submitted reform-policy Calculator object is placed in its own
+    shared-memory block, which is released as soon as its task is done,
+    while the baseline-policy shared-memory block is released by the close
+    method (or at the end of a with statement).  The results are computed
+    by the shared_response function, so they are the same as those of the
+    response function with lowcopy=True.
+    """
+
+    def __init__(self, calc_1, n_jobs=1, mp_context=None):
+        assert isinstance(n_jobs, int) and n_jobs >= 1
+        self.shared_1 = SharedCalculator(calc_1)
+        self._pool = ProcessPoolExecutor(max_workers=n_jobs,
+                                         mp_context=mp_context)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, calc_2, elasticities, dump=False, incremental=False):
+        """
+        Return concurrent.futures.Future object whose result is the (df1,
+        df2) tuple of response results for the reform-policy calc_2 and the
+        elasticities, dump and incremental arguments.
+        """
+        shared_2 = SharedCalculator(calc_2)
+        try:
+            future = self._pool.submit(shared_response, self.shared_1,
+                                       shared_2, elasticities, dump,
+                                       incremental)
+        except BaseException:
+            shared_2.close()
+            raise
+        future.add_done_callback(lambda _: shared_2.close())
+        return future
+
+    def map(self, calc_2_list, elasticities, dump=False, incremental=False):
+        """
+        Return list of the (df1, df2) tuples of response results for each
+        reform-policy Calculator object in calc_2_list.
+        """
+        futures = [self.submit(calc_2, elasticities, dump=dump,
+                               incremental=incremental)
+                   for calc_2 in calc_2_list]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+        Wait for the submitted tasks, stop the worker processes and release
+        the baseline-policy shared-memory block.
+        """
+        self._pool.shutdown()
+        self.shared_1.close()
+
+
+# Calculator objects reconstructed in this process (and the shared-memory
+# blocks they view) and Policy and Consumption objects for each year
+_CALCULATORS = dict()
+_TEMPLATES = dict()
+
+
+def _template(cls, year):
+    """
+    Return cls (Policy or Consumption) object for year, which is constructed
+    only once in each process.
+    """
+    if (cls, year) not in _TEMPLATES:
+        obj = cls()
+        obj.set_year(year)
+        _TEMPLATES[(cls, year)] = obj
+    return _TEMPLATES[(cls, year)]
+
+
+def _attach(name):
+    """
+    Return SharedMemory object attached to the named shared-memory block,
+    which is not registered with the resource tracker, because the block is
+    owned (and unlinked) by the process that created it.  Before Python
+    3.13, SharedMemory always registers the block, and a process whose
+    resource tracker is not that of the owner would then warn that the
+    block has leaked and unlink it when the process exits, so registration
+    is suppressed while the block is attached.
+    """
+    if sys.version_info >= (3, 13):
+        # pylint: disable=unexpected-keyword-arg
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = _no_register
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _no_register(name, rtype):  # pylint: disable=unused-argument
+    """
+    Replacement of resource_tracker.register that does not register.
+    """
+
+
+# lock held while shared-memory block registration is suppressed
+_ATTACH_LOCK = threading.Lock()
+
+
+def _aligned(nbytes):
+    """
+    Return nbytes rounded up to a multiple of 64 bytes.
+    """
+    return (nbytes + 63) // 64 * 64
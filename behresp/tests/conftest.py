@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 import numpy
 import pandas as pd
 import pytest
@@ -9,6 +10,21 @@ import taxcalc as tc
 numpy.seterr(all='raise')
 
 
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'requires_fork: test uses forked worker processes')
+
+
+def pytest_collection_modifyitems(config, items):
+    # skip tests using forked worker processes where fork is unavailable
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return
+    skip_fork = pytest.mark.skip(reason='fork start method is unavailable')
+    for item in items:
+        if 'requires_fork' in item.keywords:
+            item.add_marker(skip_fork)
+
+
 @pytest.fixture(scope='session')
 def tests_path():
     return os.path.abspath(os.path.dirname(__file__))
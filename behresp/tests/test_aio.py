@@ -0,0 +1,82 @@
+"""
+Tests for functions in aio.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_aio.py
+# pylint --disable=locally-disabled test_aio.py
+
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pytest
+import taxcalc as tc
+from behresp import (response, response_many, response_async,
+                     response_many_async, SharedCalculator)
+
+
+@pytest.mark.requires_fork
+def test_response_async(cps_subsample):
+    """
+    Test that response_async and response_many_async produce the same
+    results as response and response_many, using thread and process
+    executors, and that phase timeouts and cancellation work.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reforms
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    calc1 = tc.Calculator(records=rec, policy=tc.Policy())
+    calc1.advance_to_year(refyear)
+    calc2s = list()
+    for exemption in (1000, 1500):
+        pol = tc.Policy()
+        pol.implement_reform({'II_em': {refyear: exemption}})
+        calc2 = tc.Calculator(records=rec, policy=pol)
+        calc2.advance_to_year(refyear)
+        calc2s.append(calc2)
+    del pol
+    # ... calculate expected results
+    df1, df2 = response(calc1, calc2s[1], elasticities_dict, dump=True)
+    many1, many2s = response_many(calc1, calc2s, elasticities_dict)
+    # ... calculate results using the default thread executor
+    adf1, adf2 = asyncio.run(response_async(calc1, calc2s[1],
+                                            elasticities_dict, dump=True))
+    pd.testing.assert_frame_equal(adf1, df1)
+    pd.testing.assert_frame_equal(adf2, df2)
+    # ... calculate results using a process executor
+    context = multiprocessing.get_context('fork')
+    with SharedCalculator(calc1) as shared1, \
+            SharedCalculator(calc2s[0]) as shared2a, \
+            SharedCalculator(calc2s[1]) as shared2b, \
+            ProcessPoolExecutor(max_workers=2, mp_context=context) as pool:
+        amany1, amany2s = asyncio.run(response_many_async(
+            shared1, [shared2a, shared2b], elasticities_dict,
+            lowcopy=True, incremental=True, executor=pool))
+    pd.testing.assert_frame_equal(amany1, many1)
+    assert len(amany2s) == len(many2s)
+    for adf, mdf in zip(amany2s, many2s):
+        pd.testing.assert_frame_equal(adf, mdf)
+    # ... check that a timed-out phase prevents later phases
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(response_async(calc1, calc2s[1], elasticities_dict,
+                                   timeouts={'reform': 0.001}))
+
+    async def cancelled_response():
+        task = asyncio.ensure_future(response_async(calc1, calc2s[1],
+                                                    elasticities_dict))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)  # event loop is not blocked
+        return time.perf_counter() - started
+
+    assert asyncio.run(cancelled_response()) < 1.0
+    with pytest.raises(AssertionError):
+        asyncio.run(response_async(calc1, calc2s[1], elasticities_dict,
+                                   timeouts={'unknown': 1.0}))
@@ -5,12 +5,23 @@ Tests for functions in behavior.py file.
 # pycodestyle test_behavior.py
 # pylint --disable=locally-disabled test_behavior.py
 
+import copy
+import multiprocessing
 from io import StringIO
 import numpy as np
 import pandas as pd
 import pytest
 import taxcalc as tc
-from behresp import response, quantity_response, labor_response
+from behresp import (response, response_grid, response_many,
+                     response_years, response_chunks,
+                     response_aggregates, response_estimate,
+                     quantity_response, labor_response, ResponseProfile)
+from behresp.behavior import (pch_response, _decile_index, _mtrs,
+                              _elasticity_values, _process_pool)
+
+
+# n_jobs parameter of the tests that use two forked worker processes
+FORK_JOBS = pytest.param(2, marks=pytest.mark.requires_fork)
 
 
 def test_default_response_function(cps_subsample):
@@ -110,6 +121,472 @@ def test_alternative_behavior_parameters(cps_subsample):
     assert np.allclose([itax1, itax2], [1355.556, 1302.09])
 
 
+@pytest.mark.parametrize("n_jobs", [1, FORK_JOBS])
+def test_response_grid(n_jobs, cps_subsample):
+    """
+    Test that response_grid produces the same results as response
+    called separately for each elasticities dictionary.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    # ... specify several alternative response elasticities
+    elasticities_list = [{'sub': 0.25, 'inc': -0.1, 'cg': -0.79},
+                         {'inc': -0.1},
+                         {}]
+    # ... calculate behavioral responses to reform
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    df1, df2_list = response_grid(calc1, calc2, elasticities_list,
+                                  n_jobs=n_jobs)
+    assert len(df2_list) == len(elasticities_list)
+    for elasticities, df2 in zip(elasticities_list, df2_list):
+        df1r, df2r = response(calc1, calc2, elasticities)
+        assert df1.equals(df1r)
+        assert df2.equals(df2r)
+    # ... dumped reform results, including mtr_combined, are also the same
+    _, df2_list = response_grid(calc1, calc2, elasticities_list[1:],
+                                dump=True, n_jobs=n_jobs)
+    for elasticities, df2 in zip(elasticities_list[1:], df2_list):
+        _, df2r = response(calc1, calc2, elasticities, dump=True)
+        pd.testing.assert_frame_equal(df2, df2r, check_like=True)
+    del calc1
+    del calc2
+
+
+def test_lowcopy_response(cps_subsample):
+    """
+    Test that response with lowcopy=True produces the same results as
+    response with lowcopy=False and leaves calc_1 and calc_2 unchanged.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    calc1_df = calc1.dataframe(None, all_vars=True)
+    calc2_df = calc2.dataframe(None, all_vars=True)
+    # ... calculate behavioral response to reform with each copy mode
+    df1d, df2d = response(calc1, calc2, elasticities_dict, dump=True)
+    df1l, df2l = response(calc1, calc2, elasticities_dict, dump=True,
+                          lowcopy=True)
+    assert df1l.equals(df1d)
+    assert df2l.equals(df2d)
+    # ... confirm that calc1 and calc2 are unchanged
+    assert calc1.dataframe(None, all_vars=True).equals(calc1_df)
+    assert calc2.dataframe(None, all_vars=True).equals(calc2_df)
+    # ... check that invalid n_jobs arguments are rejected
+    for n_jobs in (0, -1, 2.0):
+        with pytest.raises(AssertionError):
+            response(calc1, calc2, elasticities_dict, n_jobs=n_jobs)
+        with pytest.raises(AssertionError):
+            response_aggregates(calc1, calc2, elasticities_dict,
+                                n_jobs=n_jobs)
+    del calc1
+    del calc2
+
+
+@pytest.mark.parametrize("elasticities_dict",
+                         [{'sub': 0.25, 'inc': -0.1, 'cg': -0.79},
+                          {'cg': -0.79},
+                          {}])
+def test_incremental_response(elasticities_dict, cps_subsample):
+    """
+    Test that response with incremental=True produces the same results as
+    response with incremental=False.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform with each recalculation
+    df1f, df2f = response(calc1, calc2, elasticities_dict, dump=True)
+    df1i, df2i = response(calc1, calc2, elasticities_dict, dump=True,
+                          incremental=True)
+    assert df1i.equals(df1f)
+    assert df2i.equals(df2f)
+    del calc1
+    del calc2
+
+
+@pytest.mark.requires_fork
+def test_parallel_response(cps_subsample):
+    """
+    Test that response with n_jobs=2 produces the same results as
+    response with n_jobs=1.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform serially and concurrently
+    df1s, df2s = response(calc1, calc2, elasticities_dict, dump=True)
+    df1p, df2p = response(calc1, calc2, elasticities_dict, dump=True,
+                          n_jobs=2)
+    assert df1p.equals(df1s)
+    assert df2p.equals(df2s)
+    del calc1
+    del calc2
+
+
+def test_process_pool_without_fork(monkeypatch):
+    """
+    Test that _process_pool raises a clear error when the fork start method
+    is unavailable.
+    """
+    monkeypatch.setattr(multiprocessing, 'get_all_start_methods',
+                        lambda: ['spawn'])
+    with pytest.raises(ValueError, match='fork'):
+        _process_pool(2, dict())
+
+
+@pytest.mark.parametrize("stream, n_jobs",
+                         [(False, 1),
+                          pytest.param(True, 2,
+                                       marks=pytest.mark.requires_fork)])
+def test_response_many(stream, n_jobs, cps_subsample):
+    """
+    Test that response_many produces the same results as response
+    called separately for each reform-policy calculator.
+    """
+    # ... specify Records object and several policy reforms
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reforms = [{'II_em': {refyear: 1500}},
+               {'II_rt7': {refyear: 0.45}}]
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    calc1 = tc.Calculator(records=rec, policy=tc.Policy())
+    calc1.advance_to_year(refyear)
+    calc2_list = list()
+    for reform in reforms:
+        pol = tc.Policy()
+        pol.implement_reform(reform)
+        calc2 = tc.Calculator(records=rec, policy=pol)
+        calc2.advance_to_year(refyear)
+        calc2_list.append(calc2)
+    del pol
+    # ... calculate behavioral responses to the reforms
+    df1, df2s = response_many(calc1, calc2_list, elasticities_dict,
+                              stream=stream, n_jobs=n_jobs)
+    if stream:
+        assert not isinstance(df2s, list)
+    num_df2 = 0
+    for calc2, df2 in zip(calc2_list, df2s):
+        df1r, df2r = response(calc1, calc2, elasticities_dict)
+        assert df1.equals(df1r)
+        assert df2.equals(df2r)
+        num_df2 += 1
+    assert num_df2 == len(reforms)
+    del calc1
+    del calc2_list
+
+
+@pytest.mark.parametrize("n_jobs", [1, FORK_JOBS])
+def test_response_years(n_jobs, cps_subsample):
+    """
+    Test that response_years produces the same results as response
+    called separately for each year.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform in several years
+    years = [refyear + 1, refyear]
+    results = response_years(calc1, calc2, elasticities_dict, years,
+                             n_jobs=n_jobs)
+    assert list(results.keys()) == sorted(years)
+    assert calc1.current_year == refyear
+    for year in years:
+        calc1y = copy.deepcopy(calc1)
+        calc2y = copy.deepcopy(calc2)
+        calc1y.advance_to_year(year)
+        calc2y.advance_to_year(year)
+        df1r, df2r = response(calc1y, calc2y, elasticities_dict)
+        df1, df2 = results[year]
+        assert df1.equals(df1r)
+        assert df2.equals(df2r)
+    del calc1
+    del calc2
+
+
+@pytest.mark.parametrize("dump, n_jobs",
+                         [(False, 1),
+                          pytest.param(True, 2,
+                                       marks=pytest.mark.requires_fork)])
+def test_response_chunks(dump, n_jobs, cps_subsample):
+    """
+    Test that response_chunks produces the same results as response.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform with and without chunks
+    df1, df2 = response(calc1, calc2, elasticities_dict, dump=dump)
+    chunk_size = calc1.array_len // 3 + 1
+    df1c, df2c = response_chunks(calc1, calc2, elasticities_dict,
+                                 chunk_size, dump=dump, n_jobs=n_jobs)
+    assert df1c.equals(df1)
+    assert df2c.equals(df2)
+    num_chunks = 0
+    for df1c, df2c in response_chunks(calc1, calc2, elasticities_dict,
+                                      chunk_size, dump=dump, stream=True,
+                                      n_jobs=n_jobs):
+        assert len(df1c.index) <= chunk_size
+        assert df1c.equals(df1.iloc[df1c.index])
+        assert df2c.equals(df2.iloc[df2c.index])
+        num_chunks += 1
+    assert num_chunks == 3
+    del calc1
+    del calc2
+
+
+def test_response_aggregates(cps_subsample):
+    """
+    Test that response_aggregates produces the same weighted totals as
+    those computed from the response DataFrame objects.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform
+    df1, df2 = response(calc1, calc2, elasticities_dict)
+    variables = ['iitax', 'payrolltax', 'combined', 'c04800']
+    aggs = response_aggregates(calc1, calc2, elasticities_dict,
+                               variables=variables, deciles=True)
+    for name, dfx in (('baseline', df1), ('reform', df2)):
+        for var in variables:
+            total = (dfx[var] * dfx['s006']).sum()
+            assert np.allclose(aggs[name][var], total)
+            assert np.allclose(aggs[name + '_deciles'][var].sum(), total)
+            assert aggs[name + '_deciles'][var].shape == (10,)
+    # ... confirm each decile contains one-tenth of the total weight
+    income = np.arange(100, 0, -1)
+    decile = _decile_index(income, np.ones(100))
+    assert np.array_equal(np.bincount(decile), np.full(10, 10))
+    assert decile[0] == 9 and decile[-1] == 0
+    del calc1
+    del calc2
+
+
+def test_response_estimate(cps_subsample):
+    """
+    Test that response_estimate produces the same results as response for
+    the filing units whose taxes are not estimated and approximately the
+    same weighted tax totals.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}, 'II_rt7': {refyear: 0.45}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate exact and estimated behavioral responses to reform
+    df1, df2 = response(calc1, calc2, elasticities_dict)
+    for fallback in (True, False):
+        df1e, df2e = response_estimate(calc1, calc2, elasticities_dict,
+                                       fallback=fallback)
+        assert df1e.equals(df1)
+        estimated = df2e['estimated'] == 1.
+        unreliable = df2e['unreliable'] == 1.
+        assert estimated.sum() > 0
+        assert unreliable.sum() > 0
+        assert (estimated & unreliable).any() == (not fallback)
+        assert df2e.loc[~estimated, df2.columns].equals(df2.loc[~estimated])
+        for var in ('iitax', 'payrolltax', 'combined'):
+            total = (df2[var] * df2['s006']).sum()
+            total_est = (df2e[var] * df2e['s006']).sum()
+            assert np.allclose(total_est, total, rtol=0.002)
+    del calc1
+    del calc2
+
+
+@pytest.mark.parametrize("dump", [False, True])
+def test_dedup_response(dump, cps_subsample):
+    """
+    Test that response with dedup=True produces the same results as
+    response with dedup=False for data containing identical filing units.
+    """
+    # ... specify Records object containing three copies of the subsample
+    # that differ only in their RECID and s006 values
+    data = pd.concat([cps_subsample] * 3, ignore_index=True)
+    data['RECID'] = np.arange(1, len(data.index) + 1)
+    data['s006'] = data['s006'] / 3.
+    rec = tc.Records.cps_constructor(data=data)
+    refyear = 2020
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform({'II_em': {refyear: 1500}})
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response with and without deduplication
+    df1, df2 = response(calc1, calc2, elasticities_dict, dump=dump)
+    profile = ResponseProfile(trace_memory=False)
+    ddf1, ddf2 = response(calc1, calc2, elasticities_dict, dump=dump,
+                          dedup=True, profile=profile)
+    del calc1
+    del calc2
+    pd.testing.assert_frame_equal(ddf1, df1)
+    pd.testing.assert_frame_equal(ddf2, df2)
+    names = [stats['phase'] for stats in profile.phases]
+    assert names[0] == 'dedup'
+    assert names[-1] == 'expand'
+
+
+def test_group_elasticities(cps_subsample):
+    """
+    Test that response with group elasticities produces the same results
+    for each group's filing units as response with that group's scalar
+    elasticities, and that equivalent per-record elasticity arrays (also
+    with dedup=True and in chunks) produce the same results.
+    """
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    grouped = {'group': 'MARS', 'sub': {1: 0.2, 2: 0.3}, 'inc': -0.1,
+               'cg': {2: -0.79}}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform({'II_em': {refyear: 1500}})
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    mars = calc1.array('MARS')
+    # ... calculate behavioral response in a single pass over all groups
+    df1, df2 = response(calc1, calc2, grouped)
+    for group, in_group in ((1, mars == 1), (2, mars == 2),
+                            (None, mars > 2)):
+        df1g, df2g = response(calc1, calc2,
+                              {'sub': grouped['sub'].get(group, 0.0),
+                               'inc': -0.1,
+                               'cg': grouped['cg'].get(group, 0.0)})
+        pd.testing.assert_frame_equal(df1[in_group], df1g[in_group])
+        pd.testing.assert_frame_equal(df2[in_group], df2g[in_group])
+    # ... check equivalent per-record elasticity arrays
+    per_record = {'sub': np.where(mars == 1, 0.2,
+                                  np.where(mars == 2, 0.3, 0.0)),
+                  'inc': np.full(calc1.array_len, -0.1),
+                  'cg': np.where(mars == 2, -0.79, 0.0)}
+    json_grouped = {'group': 'MARS', 'sub': {'1': 0.2, '2': 0.3},
+                    'inc': -0.1, 'cg': {'2': -0.79}}
+    for value, expect in zip(_elasticity_values(json_grouped, calc1),
+                             _elasticity_values(per_record)):
+        assert np.array_equal(np.broadcast_to(value, expect.shape), expect)
+    _, df2a = response(calc1, calc2, per_record, lowcopy=True, dedup=True)
+    pd.testing.assert_frame_equal(df2a, df2)
+    _, df2c = response_chunks(calc1, calc2, per_record, chunk_size=1000)
+    pd.testing.assert_frame_equal(df2c, df2)
+    # ... check elementwise sign and length checks
+    with pytest.raises(AssertionError):
+        response(calc1, calc2, {'group': 'MARS', 'sub': {1: 0.2, 2: -0.1}})
+    with pytest.raises(AssertionError):
+        response(calc1, calc2, {'inc': np.full(calc1.array_len - 1, -0.1)})
+    del calc1
+    del calc2
+
+
+def test_mtrs(cps_subsample):
+    """
+    Test that _mtrs, which reuses the calc_all() results, produces exactly
+    the same marginal tax rates as the Calculator.mtr method and leaves the
+    Calculator object unchanged.
+    """
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    pol = tc.Policy()
+    pol.implement_reform({'II_em': {2020: 1500}})
+    calc = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc.advance_to_year(2020)
+    calc.calc_all()
+    expect_calc = copy.deepcopy(calc)
+    mtr_vars = ['e00200p', 'e00200s', 'p23250', 'k1bx14p']
+    rates = _mtrs(calc, mtr_vars)
+    for var in mtr_vars:
+        expect = expect_calc.mtr(var, wrt_full_compensation=True)
+        for rate, expect_rate in zip(rates[var], expect):
+            assert np.array_equal(rate, expect_rate, equal_nan=True)
+    # expect_calc is left in the state of its calc_all() call by calc.mtr
+    pd.testing.assert_frame_equal(calc.dataframe(None, all_vars=True),
+                                  expect_calc.dataframe(None, all_vars=True),
+                                  check_like=True)
+    del calc
+    del expect_calc
+
+
 def test_quantity_response():
     """
     Test quantity_response function.
@@ -139,6 +616,87 @@ def test_labor_response():
     assert np.allclose(res_lr, res_qr)
 
 
+def test_fused_response_kernels():
+    """
+    Test that the fused pch_response, quantity_response and labor_response
+    kernels produce the same float64 results as the equivalent numpy
+    expressions and that they support the out and dtype arguments.
+    """
+    rng = np.random.RandomState(180)
+    size = 1000
+    args = list()
+    for low, high in ((-1., 2.), (-1., 2.), (-1e3, 1e5), (-1e3, 1e5)):
+        arg = rng.uniform(low, high, size)
+        arg[rng.uniform(size=size) < 0.1] = 0.
+        arg[rng.uniform(size=size) < 0.1] = np.nan
+        args.append(arg)
+    price1, price2, income1, income2 = args
+    quantity = rng.uniform(0., 1e5, size)
+    with np.errstate(invalid='ignore'):
+        # ... pch_response
+        val1 = np.where(price1 == 0, np.nan, price1)
+        expect = -0.2 * np.where(np.isnan(val1), 0, price2 / val1 - 1.)
+        assert np.array_equal(pch_response(-0.2, price1, price2), expect,
+                              equal_nan=True)
+        # ... quantity_response
+        expect = quantity * (
+            pch_response(-0.2, np.maximum(price1, 0.01),
+                         np.maximum(price2, 0.01)) +
+            pch_response(0.1, np.maximum(income1, 1.0),
+                         np.maximum(income2, 1.0)))
+        res = quantity_response(quantity, -0.2, price1, price2,
+                                0.1, income1, income2)
+        assert np.array_equal(res, expect, equal_nan=True)
+        # ... labor_response
+        res = labor_response(quantity, 0.2, 1. - price1, 1. - price2,
+                             0.1, income1, income2)
+        expect = quantity_response(quantity, 0.2, price1, price2,
+                                   0.1, income1, income2)
+        assert np.allclose(res, expect, equal_nan=True)
+        # ... out and dtype arguments
+        out = np.zeros(size)
+        res = quantity_response(quantity, 0.2, price1, price2,
+                                0.1, income1, income2, out=out)
+        assert res is out
+        assert np.array_equal(out, expect, equal_nan=True)
+        res = labor_response(quantity, 0.2, 1. - price1, 1. - price2,
+                             0.1, income1, income2, dtype=np.float32)
+        assert res.dtype == np.float32
+        assert np.allclose(res, expect, rtol=1e-4, equal_nan=True)
+
+
+def test_scenario_response():
+    """
+    Test that quantity_response and labor_response with scenarios=True
+    produce the same results as calling them for each scenario.
+    """
+    rng = np.random.RandomState(180)
+    size = 1000
+    earnings = rng.uniform(0., 1e5, size)
+    mtr1 = rng.uniform(-0.1, 0.6, size)
+    mtr2 = rng.uniform(-0.1, 0.6, size)
+    income1 = rng.uniform(-1e3, 1e5, size)
+    income2 = rng.uniform(-1e3, 1e5, size)
+    sub_draws = rng.uniform(0., 0.5, 7)
+    inc_draws = rng.uniform(-0.2, 0., (7, size))
+    res = labor_response(earnings, sub_draws, mtr1, mtr2,
+                         inc_draws, income1, income2, scenarios=True)
+    assert res.shape == (7, size)
+    for draw in range(7):
+        expect = labor_response(earnings, sub_draws[draw], mtr1, mtr2,
+                                inc_draws[draw], income1, income2)
+        assert np.array_equal(res[draw], expect)
+    out = np.zeros((7, size))
+    res = quantity_response(earnings, -sub_draws, 1. - mtr1, 1. - mtr2,
+                            0.1, income1, income2, out=out, scenarios=True)
+    assert res is out
+    for draw in range(7):
+        expect = quantity_response(earnings, -sub_draws[draw],
+                                   1. - mtr1, 1. - mtr2,
+                                   0.1, income1, income2)
+        assert np.array_equal(res[draw], expect)
+
+
 @pytest.mark.skip
 @pytest.mark.parametrize("stcg",
                          [-3600,
@@ -0,0 +1,113 @@
+"""
+Tests for functions in cache.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_cache.py
+# pylint --disable=locally-disabled test_cache.py
+
+import os
+import numpy as np
+import pytest
+import taxcalc as tc
+from behresp import response, response_many, BaselineCache
+
+
+@pytest.mark.parametrize("dump", [False, True])
+def test_cached_response(dump, cps_subsample, tmpdir):
+    """
+    Test that response produces the same results with and without a
+    BaselineCache and that the second cached call loads baseline results.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response without and with a cache
+    cache = BaselineCache(str(tmpdir))
+    key = cache.key(calc1)
+    assert key != cache.key(calc2)
+    df1, df2 = response(calc1, calc2, elasticities_dict, dump=dump)
+    assert cache.load(key, ['wage_mtr']) is None
+    df1s, df2s = response(calc1, calc2, elasticities_dict, dump=dump,
+                          cache=cache)
+    assert cache.load(key, ['wage_mtr', 'ltcg_mtr']) is not None
+    df1c, df2c = response(calc1, calc2, elasticities_dict, dump=dump,
+                          cache=cache)
+    for dfx in (df1s, df1c):
+        assert dfx.equals(df1)
+    for dfx in (df2s, df2c):
+        assert dfx.equals(df2)
+    # ... confirm response_many also uses the cached baseline results
+    df1m, df2m = response_many(calc1, [calc2], elasticities_dict,
+                               dump=dump, cache=cache)
+    assert df1m.equals(df1)
+    assert df2m[0].equals(df2)
+    del calc1
+    del calc2
+
+
+def test_cached_mtrs(cps_subsample, tmpdir):
+    """
+    Test that baseline results stored without a marginal tax rate are not
+    loaded by a later response call that needs that marginal tax rate.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate cg-only response and then sub/inc response on one cache
+    cache = BaselineCache(str(tmpdir))
+    response(calc1, calc2, {'cg': -0.79}, cache=cache)
+    assert cache.load(cache.key(calc1), ['ltcg_mtr']) is not None
+    assert cache.load(cache.key(calc1), ['wage_mtr']) is None
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1}
+    df1c, df2c = response(calc1, calc2, elasticities_dict, cache=cache)
+    df1, df2 = response(calc1, calc2, elasticities_dict)
+    assert df1c.equals(df1)
+    assert df2c.equals(df2)
+    del calc1
+    del calc2
+
+
+def test_cache_eviction(tmpdir):
+    """
+    Test that BaselineCache evicts least-recently-used entries.
+    """
+    arrays = {'x': np.arange(1000, dtype=np.float64)}
+    entry_bytes = 8000 + 128  # array data plus .npy header
+    cache = BaselineCache(str(tmpdir), max_bytes=2 * entry_bytes)
+    cache.store('key1', arrays)
+    cache.store('key2', arrays)
+    os.utime(os.path.join(str(tmpdir), 'key1'), (1, 1))
+    os.utime(os.path.join(str(tmpdir), 'key2'), (2, 2))
+    assert cache.load('key1', ['x']) is not None  # key1 now most recent
+    cache.store('key3', arrays)
+    assert cache.load('key2', ['x']) is None
+    assert np.allclose(cache.load('key1', ['x'])['x'], arrays['x'])
+    assert np.allclose(cache.load('key3', ['x'])['x'], arrays['x'])
+    # ... an entry that is being stored (by another process) is not evicted
+    open(os.path.join(str(tmpdir), 'key1', '.tmp-x.npy'), 'w').close()
+    os.utime(os.path.join(str(tmpdir), 'key1'), (1, 1))
+    cache.store('key4', arrays)
+    assert cache.load('key1', ['x']) is not None
+    assert cache.load('key3', ['x']) is None
+    cache.clear()
+    assert cache.load('key4', ['x']) is None
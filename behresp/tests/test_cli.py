@@ -0,0 +1,103 @@
+"""
+Tests for functions in cli.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_cli.py
+# pylint --disable=locally-disabled test_cli.py
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import taxcalc as tc
+from behresp import response_aggregates, DumpHandle
+from behresp.cli import cli_main
+
+
+@pytest.mark.requires_fork
+def test_cli_main(cps_subsample, tmp_path, capsys):
+    """
+    Test that cli_main scores all cells of the cross-product, writes the
+    same aggregates as response_aggregates, and resumes after a crash
+    without rescoring the completed cells.
+    """
+    # pylint: disable=too-many-locals
+    # ... write input files
+    data_path = str(tmp_path / 'sub_cps.csv')
+    cps_subsample.to_csv(data_path, index=False)
+    reform_paths = list()
+    for exemption in (1000, 1500):
+        path = str(tmp_path / 'em{}.json'.format(exemption))
+        with open(path, 'w') as jfile:
+            json.dump({'II_em': {'2020': exemption}}, jfile)
+        reform_paths.append(path)
+    elasticities = {'low': {'sub': 0.25, 'inc': -0.1, 'cg': -0.79},
+                    'cg': {'cg': -3.45}}
+    elasticities_path = str(tmp_path / 'elasticities.json')
+    with open(elasticities_path, 'w') as jfile:
+        json.dump(elasticities, jfile)
+    outdir = str(tmp_path / 'out')
+    arguments = ['--data', data_path, '--reforms'] + reform_paths + [
+        '--elasticities', elasticities_path, '--years', '2020-2021',
+        '--outdir', outdir]
+    # ... score all cells
+    assert cli_main(arguments) == 0
+    assert 'scoring 8 of 8 cells' in capsys.readouterr().out
+    aggs = pd.read_csv(os.path.join(outdir, 'aggregates.csv'))
+    assert len(aggs.index) == 8 * 4
+    # ... compare one cell with response_aggregates using the same data
+    # (the CPS weights are aligned with the data index, which the CSV file
+    # does not contain)
+    rec = tc.Records.cps_constructor(data=pd.read_csv(data_path))
+    calc1 = tc.Calculator(records=rec, policy=tc.Policy())
+    pol = tc.Policy()
+    pol.implement_reform({'II_em': {2020: 1500}})
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(2021)
+    calc2.advance_to_year(2021)
+    expect = response_aggregates(calc1, calc2, elasticities['low'])
+    cell = aggs[(aggs['reform'] == 'em1500') &
+                (aggs['elasticities'] == 'low') & (aggs['year'] == 2021)]
+    cell = cell.set_index('variable')
+    for var, total in expect['baseline'].items():
+        assert np.isclose(cell.loc[var, 'baseline_total'], total)
+    for var, total in expect['reform'].items():
+        assert np.isclose(cell.loc[var, 'reform_total'], total)
+    # ... resume after losing one cell, using worker processes
+    os.remove(os.path.join(outdir, 'cells', 'em1000', 'cg', '2021.json'))
+    assert cli_main(arguments + ['--n-jobs', '2']) == 0
+    assert 'scoring 1 of 8 cells' in capsys.readouterr().out
+    pd.testing.assert_frame_equal(
+        pd.read_csv(os.path.join(outdir, 'aggregates.csv')), aggs)
+    # ... write dump output of one cell
+    dumpdir = str(tmp_path / 'dump')
+    assert cli_main(['--data', data_path, '--reforms', reform_paths[1],
+                     '--elasticities', elasticities_path, '--years', '2021',
+                     '--outdir', dumpdir, '--dump']) == 0
+    handle = DumpHandle(os.path.join(dumpdir, 'dumps', 'em1500', 'low',
+                                     '2021'))
+    assert np.isclose(np.dot(handle.array('reform', 'iitax'),
+                             handle.array('reform', 's006')),
+                      expect['reform']['iitax'])
+    # ... rescore the cells of a changed reform
+    with open(reform_paths[0], 'w') as jfile:
+        json.dump({'II_em': {'2020': 1200}}, jfile)
+    assert cli_main(arguments) == 0
+    assert 'scoring 4 of 8 cells' in capsys.readouterr().out
+    # ... rescore the cells of changed input data
+    one_cell = ['--data', data_path, '--reforms', reform_paths[1],
+                '--elasticities', elasticities_path, '--years', '2021',
+                '--outdir', outdir]
+    assert cli_main(one_cell) == 0
+    assert 'scoring 0 of 2 cells' in capsys.readouterr().out
+    cps_subsample.head(1000).to_csv(data_path, index=False)
+    assert cli_main(one_cell) == 0
+    assert 'scoring 2 of 2 cells' in capsys.readouterr().out
+    # ... check argument errors
+    assert cli_main(['--data', str(tmp_path / 'missing.csv')] +
+                    arguments[2:]) == 1
+    assert 'ERROR' in capsys.readouterr().err
+    assert cli_main(arguments[:-2] + ['--outdir', outdir,
+                                      '--years', '2021-2020']) == 1
@@ -0,0 +1,46 @@
+"""
+Tests for functions in dump.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_dump.py
+# pylint --disable=locally-disabled test_dump.py
+
+import os
+import numpy as np
+import taxcalc as tc
+from behresp import response, response_dump, DumpHandle
+
+
+def test_response_dump(cps_subsample, tmpdir):
+    """
+    Test that response_dump writes the same values as those in the
+    response dump output and removes the variables of an earlier dump.
+    """
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response to reform with both dump methods
+    df1, df2 = response(calc1, calc2, elasticities_dict, dump=True)
+    os.makedirs(str(tmpdir.join('reform')))
+    np.save(str(tmpdir.join('reform', 'stale.npy')), np.zeros(3))
+    handle = response_dump(calc1, calc2, elasticities_dict, str(tmpdir))
+    assert isinstance(handle, DumpHandle)
+    assert DumpHandle(str(tmpdir)).variables('reform') == sorted(df2.columns)
+    for side, dfx in (('baseline', df1), ('reform', df2)):
+        assert handle.variables(side) == sorted(dfx.columns)
+        assert np.array_equal(handle.array(side, 'iitax'), dfx['iitax'])
+        dfh = handle.dataframe(side)
+        for var in dfx.columns:
+            assert np.array_equal(dfh[var].values, dfx[var].values)
+    del calc1
+    del calc2
@@ -0,0 +1,87 @@
+"""
+Tests that bound the peak memory allocated by the response function.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_memory.py
+# pylint --disable=locally-disabled test_memory.py
+
+import tracemalloc
+import numpy as np
+import pytest
+import taxcalc as tc
+from behresp import response
+
+
+# Largest allowed ratio of the peak memory allocated by a response call to
+# the size of the calc_1 records arrays (all its input and calculated
+# variables).  The ratio is larger for the subsample because the policy
+# parameters and other per-Calculator allocations are a larger share of
+# the total.  Without dump output, the peak (about 4.5 times the records
+# size for the subsample and 2.8 times for the full sample) occurs during
+# the marginal tax rate calculations, which copy only the calculated
+# variables while the baseline and reform copies are alive.  With
+# dump=True, the peak (about 6.1 and 4.4 times) occurs while the dump
+# DataFrame objects are extracted.
+PEAK_MEMORY_MULTIPLE = {'cps_subsample': 7.0, 'cps_fullsample': 5.0}
+
+
+@pytest.fixture(scope='module')
+def compiled_response(cps_subsample):
+    """
+    Call response once on a small sample, so the one-time numba compilation
+    of the Tax-Calculator functions is not included in the peak memory.
+    """
+    rec = tc.Records.cps_constructor(data=cps_subsample.head(100))
+    calc = tc.Calculator(records=rec, policy=tc.Policy())
+    response(calc, calc, {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}, dump=True)
+    return response
+
+
+@pytest.mark.parametrize("sample", ['cps_subsample', 'cps_fullsample'])
+@pytest.mark.parametrize("dump", [False, True])
+def test_response_peak_memory(sample, dump, request, compiled_response):
+    """
+    Test that the peak memory allocated by response is no more than the
+    PEAK_MEMORY_MULTIPLE of the size of the calc_1 records arrays.
+    """
+    # pylint: disable=too-many-locals,redefined-outer-name
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=request.getfixturevalue(sample))
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    del rec
+    # ... compute size of calc1 records arrays
+    # pylint: disable=protected-access
+    records = calc1._Calculator__records
+    records_bytes = sum(np.asarray(getattr(records, var)).nbytes
+                        for var in (records.USABLE_READ_VARS |
+                                    records.CALCULATED_VARS))
+    # ... measure peak memory allocated by response
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            tracemalloc.reset_peak()
+        df1, df2 = compiled_response(calc1, calc2, elasticities_dict,
+                                     dump=dump)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    assert len(df1.index) == len(df2.index) == calc1.array_len
+    del calc1
+    del calc2
+    multiple = (peak_bytes - start_bytes) / records_bytes
+    assert multiple <= PEAK_MEMORY_MULTIPLE[sample], \
+        'peak memory is {:.2f} times records size'.format(multiple)
@@ -0,0 +1,66 @@
+"""
+Tests for functions in preview.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_preview.py
+# pylint --disable=locally-disabled test_preview.py
+
+import numpy as np
+import taxcalc as tc
+from behresp import response_aggregates, response_preview
+
+
+def test_response_preview(cps_subsample):
+    """
+    Test that response_preview refines its estimates up to the full-sample
+    response_aggregates results and stops early when the tolerance is met.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    variables = ['iitax', 'combined']
+    expect = response_aggregates(calc1, calc2, elasticities_dict,
+                                 variables=variables)
+    # ... refine up to the full sample
+    received = list()
+    preview = response_preview(calc1, calc2, elasticities_dict,
+                               variables=variables,
+                               fractions=(0.2, 0.5, 1.0),
+                               callback=received.append)
+    first = preview.estimates[0]
+    assert first['fraction'] == 0.2
+    assert first['filing_units'] < calc1.array_len
+    assert all(first['std_error'][var] > 0. for var in variables)
+    final = preview.wait()
+    assert preview.done()
+    assert [est['fraction'] for est in preview.estimates] == [0.2, 0.5, 1.0]
+    assert received == preview.estimates
+    assert final['filing_units'] == calc1.array_len
+    for var in variables:
+        assert final['half_width'][var] == 0.
+        assert np.isclose(final['baseline'][var], expect['baseline'][var])
+        assert np.isclose(final['reform'][var], expect['reform'][var])
+        # subsample change is within its error band of the full change
+        change = expect['reform'][var] - expect['baseline'][var]
+        assert abs(first['change'][var] - change) < 4. * (
+            first['std_error'][var])
+    # ... stop after the first estimate when the tolerance is met
+    preview = response_preview(calc1, calc2, elasticities_dict,
+                               variables=variables,
+                               fractions=(0.2, 0.5, 1.0), tolerance=1e15)
+    assert preview.done()
+    assert preview.wait() is preview.estimates[0]
+    assert len(preview.estimates) == 1
+    del calc1
+    del calc2
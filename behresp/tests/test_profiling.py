@@ -0,0 +1,79 @@
+"""
+Tests for functions in profiling.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_profiling.py
+# pylint --disable=locally-disabled test_profiling.py
+
+import json
+import logging
+import tracemalloc
+import taxcalc as tc
+from behresp import response, ResponseProfile
+
+
+def test_response_profile(cps_subsample, caplog, monkeypatch):
+    """
+    Test that a ResponseProfile records each phase of a response call
+    without changing the response results.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response without and with a profile
+    df1, df2 = response(calc1, calc2, elasticities_dict)
+    callback_phases = list()
+    profile = ResponseProfile(logger=logging.getLogger('behresp.test'),
+                              callback=callback_phases.append)
+    with caplog.at_level(logging.INFO, logger='behresp.test'):
+        df1p, df2p = response(calc1, calc2, elasticities_dict,
+                              profile=profile)
+    assert df1p.equals(df1)
+    assert df2p.equals(df2)
+    del calc1
+    del calc2
+    # ... check recorded phases
+    names = [stats['phase'] for stats in profile.phases]
+    assert names == ['cache_load', 'copy',
+                     'baseline_calc_all', 'baseline_wage_mtr',
+                     'baseline_ltcg_mtr',
+                     'reform_calc_all', 'reform_wage_mtr', 'reform_ltcg_mtr',
+                     'baseline_dataframe', 'add_responses',
+                     'response_calc_all', 'reform_dataframe']
+    assert callback_phases == profile.phases
+    assert len(caplog.records) == len(names)
+    for stats in profile.phases:
+        assert stats['wall_time'] >= 0.
+        assert stats['cpu_time'] >= 0.
+        assert stats['peak_memory'] >= 0
+    exported = json.loads(profile.to_json())
+    assert exported['phases'] == profile.phases
+    assert exported['totals']['peak_memory'] > 0
+    # ... check that memory tracing can be turned off
+    profile = ResponseProfile(trace_memory=False)
+    with profile.phase('noop'):
+        pass
+    assert profile.phases[0]['peak_memory'] is None
+    assert profile.totals()['peak_memory'] is None
+    # ... check that no peak is reported when the traced peak cannot be
+    # reset while tracing is already running (as on Python 3.8)
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    tracemalloc.start()
+    try:
+        profile = ResponseProfile()
+        with profile.phase('noop'):
+            pass
+    finally:
+        tracemalloc.stop()
+    assert profile.phases[0]['peak_memory'] is None
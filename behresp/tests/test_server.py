@@ -0,0 +1,99 @@
+"""
+Tests for functions in server.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_server.py
+# pylint --disable=locally-disabled test_server.py
+
+import json
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+import taxcalc as tc
+from behresp import response, response_aggregates, ResponseServer
+
+
+@pytest.mark.parametrize("n_jobs",
+                         [1, pytest.param(2, marks=pytest.mark.requires_fork)])
+def test_response_server(n_jobs, cps_subsample):
+    """
+    Test that ResponseServer produces the same results as the response and
+    response_aggregates functions, both directly and over HTTP, when the
+    requests are processed in the current process and when request batches
+    are split among worker processes.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate expected results
+    df1, df2 = response(calc1, calc2, elasticities_dict)
+    cg_only = {'cg': -0.79}
+    dump1, dump2 = response(calc1, calc2, cg_only, dump=True)
+    aggs = response_aggregates(calc1, calc2, elasticities_dict, deciles=True)
+    # ... calculate results using a server
+    with ResponseServer(calc1, n_jobs=n_jobs, max_batch=4) as server:
+        futures = [
+            server.submit({'reform': reform,
+                           'elasticities': elasticities_dict,
+                           'result': 'dataframe'}),
+            server.submit({'reform': reform, 'elasticities': cg_only,
+                           'result': 'dataframe', 'dump': True}),
+            server.submit({'reform': reform,
+                           'elasticities': elasticities_dict,
+                           'deciles': True}),
+            server.submit({'reform': {'II_emx': {refyear: 1}},
+                           'elasticities': elasticities_dict})
+        ]
+        sdf1, sdf2 = futures[0].result()
+        sdump1, sdump2 = futures[1].result()
+        saggs = futures[2].result()
+        with pytest.raises(ValueError):
+            futures[3].result()
+        with pytest.raises(AssertionError):
+            server.submit({'reform': reform,
+                           'elasticities': {'sub': -0.25}}).result()
+        # ... send JSON request to HTTP endpoint with string reform years
+        url = 'http://{}:{}'.format(*server.address)
+        body = json.dumps({'reform': reform,
+                           'elasticities': elasticities_dict,
+                           'result': 'dataframe'}).encode('utf-8')
+        with urllib.request.urlopen(url + '/response', data=body) as reply:
+            jres = json.loads(reply.read())
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(  # pylint: disable=consider-using-with
+                url + '/response', data=b'{}')
+        assert excinfo.value.code == 400
+        with urllib.request.urlopen(url + '/metrics') as reply:
+            metrics = json.loads(reply.read())
+    del calc1
+    del calc2
+    pd.testing.assert_frame_equal(sdf1, df1)
+    pd.testing.assert_frame_equal(sdf2, df2)
+    pd.testing.assert_frame_equal(sdump1, dump1)
+    pd.testing.assert_frame_equal(sdump2, dump2)
+    for name in ('baseline', 'reform'):
+        assert saggs[name] == aggs[name]
+        for var, value in aggs[name + '_deciles'].items():
+            assert np.array_equal(saggs[name + '_deciles'][var], value)
+    jdf2 = pd.DataFrame(**jres['reform'])
+    assert np.allclose(jdf2['iitax'], df2['iitax'])
+    # ... check metrics
+    assert metrics['requests'] == 7
+    assert metrics['errors'] == 3
+    assert metrics['queue_depth'] == 0
+    assert metrics['batches'] >= 2
+    assert 0. <= metrics['latency']['p50'] <= metrics['latency']['max']
+    assert metrics['queue_wait']['max'] <= metrics['latency']['max']
@@ -0,0 +1,68 @@
+"""
+Tests for functions in shared.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_shared.py
+# pylint --disable=locally-disabled test_shared.py
+
+import pickle
+import multiprocessing
+import pandas as pd
+import pytest
+import taxcalc as tc
+from behresp import (response, SharedCalculator, shared_response,
+                     SharedResponsePool)
+from behresp.shared import _CALCULATORS
+
+
+def test_shared_response(cps_subsample):
+    """
+    Test that shared_response called in this process and in the spawned
+    worker processes of a SharedResponsePool produces the same results as
+    response called in this process.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... construct pre-reform and post-reform calculators
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    # ... calculate behavioral response in this process
+    df1, df2 = response(calc1, calc2, elasticities_dict, dump=True)
+    # ... calculate behavioral response in spawned worker processes
+    with SharedCalculator(calc1) as shared1, \
+            SharedCalculator(calc2) as shared2:
+        # records arrays are not pickled
+        assert len(pickle.dumps(shared1)) < shared1.nbytes / 100
+        # reconstructed records arrays are read-only
+        calc = shared1.calculator()
+        assert calc.current_year == refyear
+        assert calc.array('e00200').tolist() == calc1.array('e00200').tolist()
+        with pytest.raises(ValueError):
+            calc.array('e00200')[0] = 1.0
+        del calc
+        # the reform calculator is released after its task
+        results = [shared_response(shared1, shared2, elasticities_dict,
+                                   dump=True)]
+        assert shared1.name in _CALCULATORS
+        assert shared2.name not in _CALCULATORS
+    context = multiprocessing.get_context('spawn')
+    with SharedResponsePool(calc1, mp_context=context) as pool:
+        # the second task reuses the worker's baseline calculator
+        results.extend(pool.map([calc2, calc2], elasticities_dict,
+                                dump=True))
+    assert pool.shared_1.name not in _CALCULATORS
+    del calc1
+    del calc2
+    # dump column order depends on the string hashing of each process
+    for sdf1, sdf2 in results:
+        pd.testing.assert_frame_equal(sdf1, df1, check_like=True)
+        pd.testing.assert_frame_equal(sdf2, df2, check_like=True)
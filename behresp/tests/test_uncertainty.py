@@ -0,0 +1,89 @@
+"""
+Tests for functions in uncertainty.py file.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle test_uncertainty.py
+# pylint --disable=locally-disabled test_uncertainty.py
+
+import numpy as np
+import taxcalc as tc
+from behresp import response, response_uncertainty, bootstrap_weights
+
+
+def test_response_uncertainty(cps_subsample):
+    """
+    Test that response_uncertainty produces the weighted totals of the
+    response results as estimates and the same standard errors as the
+    totals computed directly from the full matrix of replicate weights.
+    """
+    # pylint: disable=too-many-locals
+    # ... specify Records object and policy reform
+    rec = tc.Records.cps_constructor(data=cps_subsample)
+    refyear = 2020
+    reform = {'II_em': {refyear: 1500}}
+    elasticities_dict = {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+    # ... calculate behavioral response to reform
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform(reform)
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    del pol
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    df1, df2 = response(calc1, calc2, elasticities_dict, lowcopy=True)
+    del calc1
+    del calc2
+    weight = df1['s006'].values
+    variables = ['iitax', 'combined']
+    # ... replicate weights equal to s006 imply no uncertainty
+    same = np.tile(weight, (3, 1))
+    result = response_uncertainty(df1, df2, weights=same,
+                                  variables=variables, deciles=True)
+    assert len(result.index) == 11 * 3 * len(variables)
+    assert np.allclose(result['std_error'], 0.,
+                       atol=1e-9 * result['estimate'].abs().max())
+    totals = result[result['decile'] == 0].set_index(['side', 'variable'])
+    for var in variables:
+        baseline = np.dot(df1[var], weight)
+        reform = np.dot(df2[var], weight)
+        assert np.isclose(totals.loc[('baseline', var), 'estimate'],
+                          baseline)
+        assert np.isclose(totals.loc[('reform', var), 'estimate'], reform)
+        assert np.isclose(totals.loc[('change', var), 'estimate'],
+                          reform - baseline)
+    decile_sums = result[result['decile'] > 0].groupby(
+        ['side', 'variable'])['estimate'].sum()
+    assert np.allclose(decile_sums.loc[totals.index], totals['estimate'])
+    # ... blocked totals are the same as full matrix totals
+    replicates = np.random.default_rng(0).uniform(0.5, 1.5,
+                                                  (7, weight.size)) * weight
+    result = response_uncertainty(df1, df2, weights=replicates,
+                                  variables=variables, block_size=3,
+                                  variance_factor=4.0)
+    values1 = df1[variables].values
+    values2 = df2[variables].values
+    for side, expect, reps in (
+            ('baseline', weight @ values1, replicates @ values1),
+            ('reform', weight @ values2, replicates @ values2),
+            ('change', weight @ (values2 - values1),
+             replicates @ (values2 - values1))):
+        std_error = np.sqrt(4.0 * np.mean((reps - expect) ** 2, axis=0))
+        rows = result[result['side'] == side]
+        assert np.allclose(rows['estimate'], expect)
+        assert np.allclose(rows['std_error'], std_error)
+        assert np.all(rows['lower'] < rows['estimate'])
+        assert np.all(rows['upper'] > rows['estimate'])
+    blocks = (replicates[start:start + 2] for start in range(0, 7, 2))
+    result_blocks = response_uncertainty(df1, df2, weights=blocks,
+                                         variables=variables,
+                                         variance_factor=4.0)
+    assert np.allclose(result_blocks['std_error'], result['std_error'])
+    # ... bootstrap replicate weights are reproducible
+    assert sum(block.shape[0]
+               for block in bootstrap_weights(weight, 10, 4)) == 10
+    boot1 = response_uncertainty(df1, df2, replicates=20, seed=1,
+                                 deciles=True)
+    boot2 = response_uncertainty(df1, df2, replicates=20, seed=1,
+                                 deciles=True)
+    assert boot1.equals(boot2)
+    assert np.all(boot1[boot1['side'] == 'baseline']['std_error'] > 0.)
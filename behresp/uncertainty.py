@@ -0,0 +1,166 @@
+"""
+Replicate-weight uncertainty of the Behavioral-Responses aggregate results.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle uncertainty.py
+# pylint --disable=locally-disabled uncertainty.py
+
+import statistics
+import numpy as np
+import pandas as pd
+from behresp.behavior import _decile_index
+
+
+SIDES = ('baseline', 'reform', 'change')
+
+
+def response_uncertainty(df1, df2, weights=None, replicates=100,
+                         variables=('iitax', 'payrolltax', 'combined'),
+                         deciles=False, confidence=0.90, variance_factor=1.0,
+                         block_size=16, seed=None):
+    """
+    Returns the sampling uncertainty of the weighted totals of the specified
+    variables in the (df1, df2) results of the response function (or of any
+    of the other functions that return the same DataFrame objects), which is
+    computed from replicate weights without recalculating any taxes.
+
+    Because the per-record results of the response function do not depend
+    on the s006 weights, the totals for each set of replicate weights are
+    just weighted sums of the df1 and df2 variables.  The replicate weights
+    are processed in blocks of at most block_size replicates, each of which
+    is reduced to its totals by matrix products, so the memory used is
+    bounded by block size rather than number of replicates.
+
+    The optional weights argument specifies the replicate weights:
+     None (its default value) implies Poisson bootstrap weights generated
+       block by block by the bootstrap_weights function, using the df1 s006
+       weights (sorted by decile when deciles=True) and the replicates,
+       block_size and seed arguments,
+     a two-dimensional array (such as a memory-mapped .npy file) containing
+       one row of weights for each replicate and one column for each filing
+       unit, which is read in blocks of block_size rows, and
+     any other iterable yields two-dimensional blocks of replicate weights,
+       which are used as they are.
+    The replicates and seed arguments are used only when weights is None.
+
+    When deciles=True, the totals are also computed for each of the ten
+    deciles of filing units ranked by their df1 expanded_income (with each
+    decile containing one-tenth of the df1 s006 weight), where the deciles
+    are the same for all replicates.
+
+    The result is a DataFrame containing one row for each combination of
+    variable, side (which is baseline for the df1 totals, reform for the
+    df2 totals, and change for the difference between the reform and the
+    baseline totals) and decile (which is zero for the totals of all filing
+    units and one through ten for the decile totals), with these columns:
+     estimate: the total computed with the df1 s006 weights,
+     std_error: the square root of variance_factor times the mean squared
+       difference between the replicate totals and the estimate, and
+     lower and upper: the bounds of the normal confidence interval around
+       the estimate with the specified confidence level.
+    The default variance_factor of one is appropriate for bootstrap weights.
+    Survey replicate weights require the variance factor of their design;
+    for example, the CPS successive-difference replicate weights require a
+    variance factor of four.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    assert isinstance(variables, (list, tuple)) and variables
+    assert 0.0 < confidence < 1.0
+    assert variance_factor > 0.0
+    assert isinstance(block_size, int) and block_size >= 1
+    weight = np.asarray(df1['s006'], dtype=np.float64)
+    assert len(df2.index) == weight.size
+    values = np.column_stack([np.asarray(dframe[var], dtype=np.float64)
+                              for dframe in (df1, df2)
+                              for var in variables])
+    # sort the filing units by decile so that each decile is contiguous
+    order = None
+    bounds = [0, weight.size]
+    if deciles:
+        decile = _decile_index(np.asarray(df1['expanded_income'],
+                                          dtype=np.float64), weight)
+        order = np.argsort(decile, kind='mergesort')
+        bounds = list(np.searchsorted(decile[order], np.arange(11)))
+        values = values[order]
+    estimate = _block_totals(weight[np.newaxis, :], order, bounds, values)[0]
+    # compute the totals for each block of replicate weights
+    if weights is None:
+        # bootstrap weights are generated in sorted order
+        if order is not None:
+            weight = weight[order]
+            order = None
+        blocks = bootstrap_weights(weight, replicates, block_size, seed)
+    elif isinstance(weights, np.ndarray):
+        assert weights.ndim == 2
+        blocks = (weights[start:start + block_size]
+                  for start in range(0, weights.shape[0], block_size))
+    else:
+        blocks = weights
+    totals = list()
+    for block in blocks:
+        block = np.asarray(block, dtype=np.float64)
+        assert block.ndim == 2 and block.shape[1] == weight.size
+        totals.append(_block_totals(block, order, bounds, values))
+    totals = np.concatenate(totals)
+    assert totals.shape[0] >= 1, 'no replicate weights'
+    std_error = np.sqrt(variance_factor *
+                        np.mean((totals - estimate) ** 2, axis=0))
+    zscore = statistics.NormalDist().inv_cdf(0.5 + 0.5 * confidence)
+    nvars = len(variables)
+    rows = list()
+    for group in range(estimate.shape[0]):
+        for side_index, side in enumerate(SIDES):
+            for var_index, var in enumerate(variables):
+                column = (group, side_index * nvars + var_index)
+                rows.append({'variable': var,
+                             'side': side,
+                             'decile': group,
+                             'estimate': estimate[column],
+                             'std_error': std_error[column],
+                             'lower': (estimate[column] -
+                                       zscore * std_error[column]),
+                             'upper': (estimate[column] +
+                                       zscore * std_error[column])})
+    return pd.DataFrame(rows, columns=['variable', 'side', 'decile',
+                                       'estimate', 'std_error',
+                                       'lower', 'upper'])
+
+
+def bootstrap_weights(weight, replicates, block_size=16, seed=None):
+    """
+    Generator that yields Poisson bootstrap replicate weights in blocks of
+    at most block_size replicates, where each replicate contains the weight
+    of each filing unit multiplied by an independent Poisson(1) draw (which
+    approximates resampling the filing units with replacement), so that no
+    more than one block of replicate weights is held in memory at any time.
+    The seed argument is passed to numpy.random.default_rng, so the same
+    seed always produces the same replicate weights.
+    """
+    weight = np.asarray(weight, dtype=np.float64)
+    assert isinstance(replicates, int) and replicates >= 1
+    assert isinstance(block_size, int) and block_size >= 1
+    rng = np.random.default_rng(seed)
+    for start in range(0, replicates, block_size):
+        size = min(block_size, replicates - start)
+        yield rng.poisson(1.0, size=(size, weight.size)) * weight
+
+
+def _block_totals(block, order, bounds, values):
+    """
+    Return array containing for each replicate in the block of weights the
+    totals of all filing units (and, when there are several groups, of each
+    group of filing units) for each side and variable, where the values
+    columns contain the baseline and reform variables of the filing units
+    sorted by order into the groups that begin at the positions in bounds.
+    """
+    if order is not None:
+        block = block[:, order]
+    nvars = values.shape[1] // 2
+    groups = [block[:, bounds[i]:bounds[i + 1]] @
+              values[bounds[i]:bounds[i + 1]]
+              for i in range(len(bounds) - 1)]
+    if len(groups) > 1:
+        groups.insert(0, sum(groups))
+    totals = np.stack(groups, axis=1)
+    change = totals[:, :, nvars:] - totals[:, :, :nvars]
+    return np.concatenate([totals, change], axis=2)
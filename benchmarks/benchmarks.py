@@ -0,0 +1,244 @@
+"""
+Benchmarks of the Behavioral-Responses hot paths, which report the wall
+time, CPU time and peak allocated memory of each benchmark and which can
+compare those results with previously saved results.
+
+USAGE: python benchmarks/benchmarks.py [--quick] [--repeat N] [--save FILE]
+                                       [--compare FILE] [--threshold FRACTION]
+
+The response benchmarks use the CPS subsample (the same subsample as used
+in the tests) and the full CPS sample with dump on and off and with each
+elasticity branch (sub only, inc only, cg only, and all), and the primitive
+benchmarks use the quantity_response and labor_response functions on
+arrays with 1e5, 1e6 and 1e7 elements.  The --quick option skips the
+full-sample and the 1e7-element benchmarks.
+
+When the --compare option is used, the exit status is one if the wall time
+of any benchmark is more than the --threshold fraction (default 0.10) larger
+than its wall time in the compared results (unless the difference is less
+than MIN_SECONDS, which avoids flagging timer noise), and zero otherwise.
+"""
+# CODING-STYLE CHECKS:
+# pycodestyle benchmarks.py
+# pylint --disable=locally-disabled benchmarks.py
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import taxcalc as tc
+import behresp
+
+
+MIN_SECONDS = 0.01
+
+ELASTICITIES = {
+    'sub': {'sub': 0.25},
+    'inc': {'inc': -0.1},
+    'cg': {'cg': -0.79},
+    'all': {'sub': 0.25, 'inc': -0.1, 'cg': -0.79}
+}
+
+
+def response_benchmarks(quick):
+    """
+    Return list of (name, function) tuples for the response benchmarks.
+    """
+    cps = tc.Records.read_cps_data()
+    samples = [('cps_sub', cps.sample(frac=0.03, random_state=180))]
+    if not quick:
+        samples.append(('cps_full', cps))
+    benchmarks = list()
+    for sample_name, data in samples:
+        calc1, calc2 = _calculators(data)
+        for dump in (False, True):
+            for be_name, elasticities in ELASTICITIES.items():
+                name = 'response.{}.{}.{}'.format(
+                    sample_name, 'dump' if dump else 'nodump', be_name)
+                benchmarks.append((name, _response_function(
+                    calc1, calc2, elasticities, dump)))
+    return benchmarks
+
+
+def primitive_benchmarks(quick):
+    """
+    Return list of (name, function) tuples for the quantity_response and
+    labor_response benchmarks.
+    """
+    sizes = (10**5, 10**6) if quick else (10**5, 10**6, 10**7)
+    benchmarks = list()
+    for size in sizes:
+        arrays = _primitive_arrays(size)
+        benchmarks.append((
+            'quantity_response.{:.0e}'.format(size),
+            _quantity_function(arrays)))
+        benchmarks.append((
+            'labor_response.{:.0e}'.format(size),
+            _labor_function(arrays)))
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, repeat):
+    """
+    Return dictionary containing for each named benchmark function the
+    smallest wall time and CPU time in seconds of repeat untraced calls and
+    the peak allocated memory in bytes of one additional traced call, all
+    of which follow one untimed warm-up call that compiles the Tax-Calculator
+    numba functions the benchmark uses.
+    """
+    results = dict()
+    for name, function in benchmarks:
+        function()
+        timings = behresp.ResponseProfile(trace_memory=False)
+        for _ in range(repeat):
+            with timings.phase(name):
+                function()
+        memory = behresp.ResponseProfile(trace_memory=True)
+        with memory.phase(name):
+            function()
+        results[name] = {
+            'wall_time': min(stats['wall_time'] for stats in timings.phases),
+            'cpu_time': min(stats['cpu_time'] for stats in timings.phases),
+            'peak_memory': memory.phases[0]['peak_memory']
+        }
+        print('{:40s} {:9.4f}s {:9.4f}s {:9.1f}MB'.format(
+            name, results[name]['wall_time'], results[name]['cpu_time'],
+            results[name]['peak_memory'] / 1e6))
+        sys.stdout.flush()
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """
+    Return list of names of the benchmarks whose wall time in results is
+    more than the threshold fraction larger than in baseline results.
+    """
+    slower = list()
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            continue
+        old_time = baseline[name]['wall_time']
+        new_time = stats['wall_time']
+        if (new_time > old_time * (1.0 + threshold) and
+                new_time - old_time >= MIN_SECONDS):
+            slower.append(name)
+            print('REGRESSION {}: {:.4f}s --> {:.4f}s ({:+.1f}%)'.format(
+                name, old_time, new_time,
+                100.0 * (new_time / old_time - 1.0)))
+    return slower
+
+
+def main():
+    """
+    Parse command-line arguments, run benchmarks, save and compare results,
+    and return exit status.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the behresp hot paths.')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip full-sample and 1e7-element benchmarks')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed calls of each benchmark')
+    parser.add_argument('--save', default=None,
+                        help='name of JSON file in which to save results')
+    parser.add_argument('--compare', default=None,
+                        help='name of JSON file containing results to '
+                        'compare with (ignored if file does not exist)')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='largest allowed fractional wall-time increase')
+    args = parser.parse_args()
+    assert args.repeat >= 1
+    assert args.threshold >= 0.0
+    print('{:40s} {:>10s} {:>10s} {:>11s}'.format(
+        'benchmark', 'wall_time', 'cpu_time', 'peak_memory'))
+    benchmarks = primitive_benchmarks(args.quick)
+    benchmarks.extend(response_benchmarks(args.quick))
+    results = run_benchmarks(benchmarks, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as jfile:
+            json.dump(results, jfile, indent=2, sort_keys=True)
+    if args.compare:
+        if not os.path.isfile(args.compare):
+            print('NO RESULTS TO COMPARE WITH IN {}'.format(args.compare))
+            return 0
+        with open(args.compare) as jfile:
+            baseline = json.load(jfile)
+        if regressions(results, baseline, args.threshold):
+            return 1
+        print('NO REGRESSIONS LARGER THAN {:.0f}%'.format(
+            100.0 * args.threshold))
+    return 0
+
+
+def _calculators(data):
+    """
+    Return (calc1, calc2) tuple of baseline and reform Calculator objects
+    for the specified CPS data, using the same reform as the tests.
+    """
+    rec = tc.Records.cps_constructor(data=data)
+    refyear = 2020
+    pol = tc.Policy()
+    calc1 = tc.Calculator(records=rec, policy=pol)
+    pol.implement_reform({'II_em': {refyear: 1500}})
+    calc2 = tc.Calculator(records=rec, policy=pol)
+    calc1.advance_to_year(refyear)
+    calc2.advance_to_year(refyear)
+    return (calc1, calc2)
+
+
+def _response_function(calc1, calc2, elasticities, dump):
+    """
+    Return function that calls response, which leaves calc1 and calc2
+    unchanged, with the specified arguments.
+    """
+    return lambda: behresp.response(calc1, calc2, elasticities, dump=dump)
+
+
+def _primitive_arrays(size):
+    """
+    Return dictionary of random arrays with size elements used as the
+    arguments of the quantity_response and labor_response functions.
+    """
+    rng = np.random.RandomState(180)
+    mtr1 = rng.uniform(-0.1, 0.6, size)
+    return {'quantity': rng.uniform(0., 2e5, size),
+            'mtr1': mtr1,
+            'mtr2': np.clip(mtr1 + rng.uniform(-0.05, 0.05, size), -0.1, 0.6),
+            'income1': rng.uniform(-1e4, 5e5, size),
+            'income2': rng.uniform(-1e4, 5e5, size)}
+
+
+def _quantity_function(arrays):
+    """
+    Return function that calls quantity_response with the arrays, whose
+    after-tax prices are computed before (rather than by) the function.
+    """
+    price1 = 1. + arrays['mtr1']
+    price2 = 1. + arrays['mtr2']
+    return lambda: behresp.quantity_response(
+        quantity=arrays['quantity'],
+        price_elasticity=-0.4,
+        aftertax_price1=price1,
+        aftertax_price2=price2,
+        income_elasticity=0.1,
+        aftertax_income1=arrays['income1'],
+        aftertax_income2=arrays['income2'])
+
+
+def _labor_function(arrays):
+    """
+    Return function that calls labor_response with the arrays.
+    """
+    return lambda: behresp.labor_response(
+        earnings=arrays['quantity'],
+        substitution_eti=0.25,
+        mtr1=arrays['mtr1'],
+        mtr2=arrays['mtr2'],
+        income_elasticity=-0.1,
+        aftertax_income1=arrays['income1'],
+        aftertax_income2=arrays['income2'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,7 +19,11 @@ config = {
     'packages': ['behresp'],
     'include_package_data': True,
     'name': 'behresp',
-    'install_requires': ['numpy', 'pandas', 'taxcalc'],
+    'python_requires': '>=3.8',
+    'install_requires': ['numpy', 'pandas', 'numba', 'taxcalc'],
+    'entry_points': {
+        'console_scripts': ['behresp=behresp.cli:cli_main']
+    },
     'classifiers': [
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -28,8 +32,6 @@ config = {
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Topic :: Software Development :: Libraries :: Python Modules'],
     'tests_require': ['pytest']